@@ -0,0 +1,95 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from table import ALERT_COL, STATUS, UNITS_BY_TIPO, as_category
+
+# Quantidade a mais de Z_LIMIT desvios da média do cliente (Tipo/Unidade) é suspeita,
+# desde que haja ao menos MIN_HISTORY tickets nos HISTORY_DAYS dias antes do ticket
+Z_LIMIT = 4.0
+MIN_HISTORY = 8
+HISTORY_DAYS = 180
+REVIEWED = "revisado"
+STATS_KEYS = ["Cliente", "Tipo", "Unidade"]
+
+
+def history_table(cube: pd.DataFrame) -> pd.DataFrame:
+    """Somas acumuladas dia a dia de tickets, Quantidade e Quantidade² por (Cliente, Tipo, Unidade).
+
+    Vem do cubo diário (não relê os lançamentos) e serve para consultar, por linha,
+    a janela de histórico que termina na véspera da Data dela (`row_history`).
+    """
+    if cube.empty:
+        return pd.DataFrame({**{c: pd.Series(dtype=str) for c in STATS_KEYS},
+                             "Data": pd.Series(dtype="datetime64[ns]"), "n": [], "s": [], "q": []})
+    g = cube.groupby([cube[c].astype(str) for c in STATS_KEYS] + [cube["Data"].astype("datetime64[ns]")]).agg(
+        n=("Tickets", "sum"), s=("Quantidade", "sum"), q=("Quadrados", "sum")).reset_index()
+    # groupby ordena por chave e Data: a soma acumulada por grupo segue a ordem dos dias
+    g[["n", "s", "q"]] = g.groupby(STATS_KEYS, sort=False)[["n", "s", "q"]].cumsum()
+    return g.sort_values("Data", kind="stable", ignore_index=True)
+
+
+def row_history(rows: pd.DataFrame, table: pd.DataFrame) -> pd.DataFrame:
+    """Tickets, média e desvio de Quantidade de cada linha nos HISTORY_DAYS dias antes da Data dela.
+
+    A janela é [Data - HISTORY_DAYS, Data - 1]: a própria linha, o próprio dia e os
+    dias seguintes ficam de fora. Duas buscas `merge_asof` (somas até a véspera e até
+    o dia antes da janela) para o lote inteiro; a diferença é a janela.
+    """
+    query = pd.DataFrame({c: rows[c].astype(str).to_numpy() for c in STATS_KEYS})
+    query["pos"] = np.arange(len(rows))
+    dates = rows["Data"].to_numpy().astype("datetime64[ns]")
+
+    def before(day: np.ndarray) -> np.ndarray:
+        left = query.assign(Data=day).sort_values("Data", kind="stable")
+        hit = pd.merge_asof(left, table, on="Data", by=STATS_KEYS, direction="backward", allow_exact_matches=False)
+        return hit.sort_values("pos")[["n", "s", "q"]].fillna(0.0).to_numpy(dtype="float64")
+
+    n, s, q = (before(dates) - before(dates - np.timedelta64(HISTORY_DAYS, "D"))).T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = s / n
+        var = np.clip((q / n - media ** 2) * n / (n - 1), 0, None)
+    return pd.DataFrame({"Historico": n, "Media": media, "Desvio": np.sqrt(var)}, index=rows.index)
+
+
+def check(rows: pd.DataFrame, history: pd.DataFrame, keys: np.ndarray,
+          existing_keys: np.ndarray, today: date | None = None) -> pd.DataFrame:
+    """Aplica as regras sobre o lote inteiro de uma vez e devolve `rows` com Status/Alerta.
+
+    `history` é a tabela de `history_table` cobrindo os HISTORY_DAYS dias antes do lote. `keys` são as chaves naturais das linhas (storage.row_keys) e `existing_keys` as já
+    gravadas no mês. As regras só marcam "verificando"; nunca voltam uma linha para "ok".
+    Linhas com Alerta "revisado" (liberadas por um operador) são deixadas como estão.
+    """
+    if rows.empty:
+        return rows
+    today = pd.Timestamp(today or date.today())
+    tipo = rows["Tipo"].astype(str).to_numpy()
+    unidade = rows["Unidade"].astype(str).to_numpy()
+    qtd = rows["Quantidade"].to_numpy(dtype="float64")
+
+    valid_pairs = [f"{t}|{u}" for t, units in UNITS_BY_TIPO.items() for u in units]
+    hist = row_history(rows, history)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.abs(qtd - hist["Media"].to_numpy(dtype="float64")) / hist["Desvio"].to_numpy(dtype="float64")
+    checks = [
+        (~np.isin(np.char.add(np.char.add(tipo.astype(str), "|"), unidade.astype(str)), valid_pairs),
+         "unidade fora do padrão do tipo"),
+        (rows["Data"].to_numpy() > today.to_datetime64(), "data futura"),
+        (pd.Index(keys).duplicated(keep="first") | np.isin(keys, existing_keys), "ticket duplicado"),
+        ((hist["Historico"].fillna(0).to_numpy() >= MIN_HISTORY) & (z > Z_LIMIT),
+         "quantidade fora do histórico do cliente"),
+    ]
+    reasons = pd.Series("", index=rows.index, dtype="string")
+    bad = np.zeros(len(rows), dtype=bool)
+    for mask, msg in checks:
+        mask = np.nan_to_num(mask, nan=False).astype(bool)
+        bad |= mask
+        reasons[mask] = reasons[mask].where(reasons[mask] == "", reasons[mask] + "; ") + msg
+
+    bad &= (rows[ALERT_COL].astype(str) != REVIEWED).to_numpy()
+    if not bad.any():
+        return rows
+    status = rows["Status"].astype(str).where(~bad, "verificando")
+    alerta = rows[ALERT_COL].astype(str).where(~bad, reasons.astype(str))
+    return rows.assign(Status=as_category(status, STATUS), **{ALERT_COL: as_category(alerta)})
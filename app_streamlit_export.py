@@ -1,23 +1,36 @@
-import io
-from datetime import date, datetime
+import os
+import uuid
+from datetime import date, datetime, timedelta
 
 import pandas as pd
 import streamlit as st
 import altair as alt
 
-# Extra libs for image export
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from PIL import Image
+from anomalies import HISTORY_DAYS, Z_LIMIT
+from append_buffer import AppendBuffer
+from cache import ContentCache, QueryCache
+from editing import (EDITOR_PAGE_SIZES, SORT_COLS, EditorSnapshot, apply_back_to_global, has_pending_edits,
+                     page_order, page_slice)
+from export_worker import ExportQueue
+from exports import csv_bytes
+from perf import PerfLog, RunProfile, arrow_bytes, chart_bytes
+from importer import ImportLedger, ImportResult, file_sha256, import_csv, validate_chunk
+from queries import (MESES, RUN_RATE_DAYS, build_period_view, clicked_interval, client_comparison,
+                     downsample_cumulative, filter_rollup, month_bounds, month_label, project_month_end,
+                     projection_path, ranking_title, ranking_with_projection, rows_between, shift_range)
+from storage import ConflictError, LedgerRepository
+from table import ALERT_COL, COLS, ID_COL, TIPOS, UNIDADES, UNITS_BY_TIPO, LedgerTable
+from units import ConversionTable, convert
 
 st.set_page_config(page_title="G&V - Volumes (Toras, Cavaco & Lenha)", layout="wide")
 
 # ----------------------------- Helpers -----------------------------
-MESES = ["jan","fev","mar","abr","mai","jun","jul","ago","set","out","nov","dez"]
-UNITS_BY_TIPO = {"Toras": ["ST"], "Cavaco": ["TN", "m3"], "Lenha": ["ST", "m3", "TN"]}
-
-def csv_bytes(df: pd.DataFrame) -> bytes:
-    return df.to_csv(index=False).encode("utf-8")
+DATA_DIR = os.environ.get("GV_DATA_DIR", "dados")
+QUERY_CACHE_SIZE = 64
+EXPORT_CACHE_BYTES = 64 * 1024 * 1024
+# Limite de pontos enviados ao gráfico; períodos longos são agregados em intervalos
+CHART_MAX_POINTS = int(os.environ.get("GV_CHART_MAX_POINTS", "400"))
+ORIGINAL_UNITS = "Original (sem conversão)"
 
 # ----------------------------- Seed -----------------------------
 SEED_ROWS = [
@@ -42,22 +55,87 @@ SEED_ROWS = [
     ["2025-07-25","Cavaco","Goiás Rendereng","TN",34.12,"ok"],
     ["2025-07-25","Lenha","Cliente Lenha (exemplo)","ST",500,"ok"],
 ]
-COLS = ["Data","Tipo","Cliente","Unidade","Quantidade","Status"]
-
-if "df" not in st.session_state:
-    st.session_state.df = pd.DataFrame(SEED_ROWS, columns=COLS)
-    st.session_state.df["Data"] = pd.to_datetime(st.session_state.df["Data"]).dt.date
 
-df = st.session_state.df
+@st.cache_resource
+def get_repository() -> LedgerRepository:
+    # Uma instância por processo; os dados ficam em disco, particionados por ano/mês
+    repo = LedgerRepository(DATA_DIR)
+    if repo.is_empty():
+        repo.append(pd.DataFrame(SEED_ROWS, columns=COLS))
+    return repo
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    # Compartilhado entre sessões; entradas de versões antigas dos dados são descartadas
+    return QueryCache(maxsize=QUERY_CACHE_SIZE)
+
+@st.cache_resource
+def get_export_cache() -> ContentCache:
+    # PNG/CSV por hash de conteúdo: sessões que veem o mesmo mês reaproveitam a mesma renderização
+    return ContentCache(max_bytes=EXPORT_CACHE_BYTES)
+
+@st.cache_resource
+def get_conversions() -> ConversionTable:
+    return ConversionTable(os.path.join(DATA_DIR, "_conversoes.json"))
+
+@st.cache_resource
+def get_import_ledger() -> ImportLedger:
+    return ImportLedger(os.path.join(DATA_DIR, "_importacoes.json"))
+
+@st.cache_resource
+def get_append_buffer() -> AppendBuffer:
+    # Compartilhado pelo processo: lançamentos de todos os operadores vão juntos no mesmo lote.
+    # Os pendentes ficam também em disco e voltam ao buffer se o servidor reiniciar.
+    return AppendBuffer(get_repository().append, os.path.join(DATA_DIR, "_pendentes.jsonl"))
+
+@st.cache_resource
+def get_perf_log() -> PerfLog:
+    return PerfLog(os.environ.get("GV_PERF_LOG", os.path.join(DATA_DIR, "_desempenho.jsonl")))
+
+@st.cache_resource
+def get_export_queue() -> ExportQueue:
+    # Pool de processos com matplotlib já carregado; sobe junto com o servidor
+    return ExportQueue(get_export_cache(), log=get_perf_log())
+
+repo = get_repository()
+import_ledger = get_import_ledger()
+conversions = get_conversions()
+append_buffer = get_append_buffer()
+# Lote pendente há mais de APPEND_MAX_AGE_S segundos é gravado antes de montar a página
+append_buffer.flush_if_due()
+export_queue = get_export_queue()
+qcache = get_query_cache()
+# Medição por etapa deste rerun; vai para o log local no fim do script
+perf_log = get_perf_log()
+prof = RunProfile(session=st.session_state.setdefault("perf_sessao", uuid.uuid4().hex[:8]))
 
 # ----------------------------- Sidebar -----------------------------
 st.sidebar.title("⚙️ Controles")
 tipo_sel = st.sidebar.selectbox("Tipo", ["Todos", "Toras", "Cavaco", "Lenha"], index=0)
-ano_sel = st.sidebar.number_input("Ano", min_value=2024, max_value=2100, value=2025, step=1)
-mes_idx = st.sidebar.selectbox("Mês", list(range(1,13)), index=6, format_func=lambda i: f"{MESES[i-1]} ({i:02d})")
+modo_periodo = st.sidebar.radio("Período", ["Mês", "Intervalo de datas", "Ano até hoje", "Últimos 12 meses"], index=0)
+hoje = date.today()
+if modo_periodo == "Mês":
+    ano_sel = st.sidebar.number_input("Ano", min_value=2024, max_value=2100, value=2025, step=1)
+    mes_idx = st.sidebar.selectbox("Mês", list(range(1,13)), index=6, format_func=lambda i: f"{MESES[i-1]} ({i:02d})")
+    inicio, fim = month_bounds(ano_sel, mes_idx)
+    periodo_label = month_label(ano_sel, mes_idx)
+    periodo_slug = f"{ano_sel}-{mes_idx:02d}"
+else:
+    if modo_periodo == "Intervalo de datas":
+        intervalo = st.sidebar.date_input("De / até", value=(hoje.replace(day=1), hoje), format="DD/MM/YYYY")
+        # Enquanto só a primeira data foi escolhida, usa um dia só
+        inicio, fim = (intervalo[0], intervalo[-1]) if intervalo else (hoje, hoje)
+    elif modo_periodo == "Ano até hoje":
+        inicio, fim = date(hoje.year, 1, 1), hoje
+    else:
+        inicio, fim = (pd.Timestamp(hoje) - pd.DateOffset(months=12) + pd.Timedelta(days=1)).date(), hoje
+    periodo_label = f"{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}"
+    periodo_slug = f"{inicio:%Y%m%d}-{fim:%Y%m%d}"
 
-clientes_all = sorted(df["Cliente"].unique().tolist())
+clientes_all = qcache.get_or_compute(repo.version, ("clientes",), repo.clientes)
 cliente_sel = st.sidebar.selectbox("Cliente", ["Todos"] + clientes_all, index=0)
+unidade_sel = st.sidebar.selectbox("Unidade do relatório", UNIDADES + [ORIGINAL_UNITS], index=0,
+                                   help="Gráficos, ranking e comparativo convertidos pela tabela de fatores.")
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("CSV")
@@ -66,200 +144,483 @@ st.sidebar.caption("A exportação principal fica no bloco da tabela.")
 st.title("📊 Cavaco, Toras & Lenha — Volume Diário (G&V)")
 
 # ----------------------------- Filtros no DataFrame -----------------------------
-df_use = df.copy()
-df_use["Data"] = pd.to_datetime(df_use["Data"]).dt.date
-df_use = df_use[(pd.to_datetime(df_use["Data"]).dt.year == ano_sel) &
-                (pd.to_datetime(df_use["Data"]).dt.month == mes_idx)]
-if tipo_sel != "Todos":
-    df_use = df_use[df_use["Tipo"] == tipo_sel]
-if cliente_sel != "Todos":
-    df_use = df_use[df_use["Cliente"] == cliente_sel]
+# Lê somente as partições que cruzam o período; o corte por dia é busca binária na Data ordenada.
+# Tudo fica em cache por (versão dos dados, filtros): cliques que não mudam nada não refazem contas.
+tipo_arg = None if tipo_sel == "Todos" else tipo_sel
+cliente_arg = None if cliente_sel == "Todos" else cliente_sel
+unit_arg = None if unidade_sel == ORIGINAL_UNITS else unidade_sel
+with prof.stage("filtros") as rec:
+    table = qcache.get_or_compute(
+        repo.version, ("table", tuple(repo.periods_between(inicio, fim))),
+        lambda: LedgerTable(repo.load_range(inicio, fim), normalized=True),
+    )
+    # Gráficos e ranking saem do cubo diário (Data, Tipo, Cliente, Unidade), mantido a cada gravação
+    # A unidade e a versão da tabela de fatores entram na chave: cada unidade tem a sua entrada no cache
+    view = qcache.get_or_compute(
+        repo.version, ("view", inicio, fim, tipo_arg, cliente_arg, unit_arg, conversions.version),
+        lambda: build_period_view(table, repo.rollup_range(inicio, fim), inicio, fim, tipo=tipo_arg, cliente=cliente_arg,
+                                  factors=conversions.frame(), unit=unit_arg),
+    )
+    df_use = view.rows
+    rec["linhas"] = len(df_use)
+qtd_label = f"Quantidade ({unit_arg})" if unit_arg else "Quantidade (unidades originais)"
+if view.unconverted:
+    st.warning(f"{view.unconverted} ticket(s) sem fator de conversão para {unit_arg} ficaram fora dos totais; "
+               "complete a tabela de fatores.")
+elif unit_arg is None and df_use["Unidade"].nunique() > 1:
+    st.warning("O período mistura unidades: sem conversão, os totais somam ST, TN e m³ juntos.")
+
+# Projeção de fim de mês: só quando o período inclui hoje e o mês ainda não acabou
+mes_inicio, mes_fim = month_bounds(hoje.year, hoje.month)
+projection = None
+if inicio <= hoje <= fim and hoje < mes_fim and not df_use.empty:
+    def build_projection():
+        # Entregue no mês e ritmo das últimas semanas, na mesma unidade e filtros do gráfico
+        def cube(s, e):
+            return convert(filter_rollup(repo.rollup_range(s, e), tipo=tipo_arg, cliente=cliente_arg),
+                           conversions.frame(), unit_arg)[0]
+        return project_month_end(cube(mes_inicio, hoje), cube(hoje - timedelta(days=RUN_RATE_DAYS - 1), hoje), hoje)
+
+    with prof.stage("projecao") as rec:
+        projection = qcache.get_or_compute(
+            repo.version, ("projecao", hoje, tipo_arg, cliente_arg, unit_arg, conversions.version), build_projection)
+        rec["linhas"] = len(projection.by_group)
+
+# ----------------------------- Exportações (fila de trabalhos) -----------------------------
+@st.fragment(run_every=1.0)
+def wait_export(key: str) -> None:
+    # Consulta a fila a cada segundo só neste trecho; quando fica pronto, redesenha a página
+    status = export_queue.status(key)
+    if status == "processando":
+        st.caption("⏳ Gerando arquivo…")
+    else:
+        st.rerun()
+
+def export_control(kind: str, label: str, make_args, file_name: str, mime: str, disabled: bool) -> None:
+    # Gerar → (fila em outro processo) → baixar. O pedido vale para os dados/filtros atuais.
+    slot = f"export_{kind}"
+    # Unidade e fatores entram junto: o ranking (e o título do PNG) mudam com eles
+    params = (repo.version, inicio, fim, tipo_arg, cliente_arg, unit_arg, conversions.version)
+    job = st.session_state.get(slot)
+    key = job[1] if job and job[0] == params else None
+    status = export_queue.status(key) if key else None
+    if status == "pronto":
+        st.download_button(label, data=export_queue.result(key), file_name=file_name, mime=mime)
+    elif status == "processando":
+        wait_export(key)
+    else:
+        if status == "erro":
+            st.error(f"Falha ao gerar: {export_queue.error(key)}")
+        if st.button(label.replace("⬇️ Exportar", "⚙️ Gerar"), key=f"gerar_{kind}", disabled=disabled):
+            with prof.stage(f"enfileirar_{kind}") as rec:
+                args = make_args()
+                rec["linhas"] = len(args[0])
+                st.session_state[slot] = (params, export_queue.submit(kind, *args))
+            perf_log.record_run(prof)
+            st.rerun()
 
 # ----------------------------- Gráficos -----------------------------
 left, right = st.columns(2)
 
 with left:
-    st.subheader("📈 Acumulado do período (mês selecionado)")
+    st.subheader(f"📈 Acumulado do período ({periodo_label})")
     if df_use.empty:
         st.info("Nenhum registro encontrado com os filtros selecionados.")
         line = None
     else:
-        df_sorted = df_use.sort_values("Data").copy()
-        df_sorted["Acumulado"] = df_sorted["Quantidade"].cumsum()
-        line = alt.Chart(df_sorted).mark_line(point=True).encode(
-            x=alt.X("Data:T", title="Data"),
-            y=alt.Y("Acumulado:Q", title="Quantidade acumulada"),
-            tooltip=COLS + ["Acumulado"]
-        )
-        st.altair_chart(line, use_container_width=True)
+        with prof.stage("grafico_acumulado") as rec:
+            # Só agregados vão para o navegador: um ponto por dia, no máximo CHART_MAX_POINTS
+            df_sorted = downsample_cumulative(view.cumulative, CHART_MAX_POINTS)
+            ponto = alt.selection_point(name="ponto", fields=["InicioDia", "Dia"], on="click")
+            line = alt.Chart(df_sorted).mark_line(point=True).encode(
+                x=alt.X("Data:T", title="Data"),
+                y=alt.Y("Acumulado:Q", title=f"{qtd_label} acumulada"),
+                tooltip=[alt.Tooltip("Data:T"), "Quantidade", "Tickets", "Acumulado"]
+            ).add_params(ponto)
+            if projection is not None:
+                # Continuação tracejada até o fim do mês, pelo ritmo recente de cada cliente/tipo
+                dashed = alt.Chart(projection_path(view.cumulative, projection, hoje)).mark_line(strokeDash=[6, 4]).encode(
+                    x="Data:T", y="Acumulado:Q",
+                    tooltip=[alt.Tooltip("Data:T"), alt.Tooltip("Acumulado:Q", title="Projetado", format=",.1f")],
+                )
+                line = line + dashed
+            event = st.altair_chart(line, use_container_width=True, on_select="rerun", key="chart_acumulado")
+            rec["linhas"], rec["bytes"] = len(df_sorted), chart_bytes(line)
+        # Detalhe dos lançamentos só do ponto clicado, buscado no servidor
+        selected = event.selection.get("ponto") if event else None
+        if selected:
+            # O intervalo do ponto tem nomes próprios: inicio/fim continuam sendo o período da barra lateral,
+            # usado adiante pelo comparativo, pelas exportações e pelo editor
+            ponto_inicio, ponto_fim = clicked_interval(selected[0])
+            detalhe = rows_between(df_use, ponto_inicio, ponto_fim)
+            st.caption(f"Lançamentos de {ponto_inicio:%d/%m/%Y}"
+                       + (f" a {ponto_fim:%d/%m/%Y}" if ponto_fim != ponto_inicio else "") + f": {len(detalhe)}")
+            st.dataframe(detalhe[COLS], use_container_width=True, hide_index=True)
+        else:
+            st.caption("Clique em um ponto para ver os lançamentos do dia.")
 
 with right:
-    st.subheader("🏆 Ranking por Cliente (mês selecionado)")
+    st.subheader(f"🏆 Ranking por Cliente ({periodo_label})")
     if df_use.empty:
         st.info("Nenhum registro para ranking.")
         bar_data = pd.DataFrame(columns=["Cliente","Quantidade"])
         bar_chart = None
     else:
-        bar_data = df_use.groupby("Cliente", as_index=False)["Quantidade"].sum().sort_values("Quantidade", ascending=False)
-        bar_chart = alt.Chart(bar_data).mark_bar().encode(
-            x=alt.X("Cliente:N", sort="-y"),
-            y=alt.Y("Quantidade:Q"),
-            tooltip=["Cliente","Quantidade"]
+        with prof.stage("grafico_ranking") as rec:
+            bar_data = view.ranking if projection is None else ranking_with_projection(view.ranking, projection)
+            ordem_barras = alt.EncodingSortField("Quantidade", order="descending")
+            bar_chart = alt.Chart(bar_data).mark_bar().encode(
+                x=alt.X("Cliente:N", sort=ordem_barras),
+                y=alt.Y("Quantidade:Q", title=qtd_label),
+                tooltip=list(bar_data.columns)
+            )
+            if projection is not None:
+                # Marca da projeção de fim de mês sobre cada barra
+                bar_chart = bar_chart + alt.Chart(bar_data).mark_tick(color="gray", thickness=2).encode(
+                    x=alt.X("Cliente:N", sort=ordem_barras), y="Projeção:Q", tooltip=list(bar_data.columns))
+            st.altair_chart(bar_chart, use_container_width=True)
+            if projection is not None:
+                st.caption(f"Traço cinza: projeção para {mes_fim:%d/%m/%Y}, pelo ritmo por dia da semana "
+                           f"das últimas {RUN_RATE_DAYS // 7} semanas.")
+                with st.expander("Projeção por cliente e tipo"):
+                    st.dataframe(projection.by_group.rename(columns={"Ritmo": "Ritmo (por dia)", "Projecao": "Projeção"}),
+                                 use_container_width=True, hide_index=True)
+            rec["linhas"], rec["bytes"] = len(bar_data), chart_bytes(bar_chart)
+
+# ----------------------------- Comparativo -----------------------------
+def build_comparison() -> pd.DataFrame:
+    # Mesmo intervalo um mês e um ano antes, tudo lido do cubo diário
+    cubes = [
+        convert(filter_rollup(repo.rollup_range(s, e), tipo=tipo_arg, cliente=cliente_arg), conversions.frame(), unit_arg)[0]
+        for s, e in ((inicio, fim), shift_range(inicio, fim, -1), shift_range(inicio, fim, -12))
+    ]
+    return client_comparison(*cubes)
+
+with st.expander("🔁 Comparativo por cliente (mês anterior / ano anterior)"):
+    with prof.stage("comparativo") as rec:
+        comparativo = qcache.get_or_compute(
+            repo.version, ("comparativo", inicio, fim, tipo_arg, cliente_arg, unit_arg, conversions.version), build_comparison)
+        rec["linhas"] = len(comparativo)
+    if comparativo.empty:
+        st.info("Sem dados no período nem nos períodos de comparação.")
+    else:
+        st.dataframe(
+            comparativo,
+            use_container_width=True,
+            hide_index=True,
+            column_config={c: st.column_config.NumberColumn(c, format="%.1f%%") for c in ("Δ MoM %", "Δ YoY %")},
         )
-        st.altair_chart(bar_chart, use_container_width=True)
 
 # ----------------------------- CRUD: Lançamentos -----------------------------
 st.subheader("📋 Lançamentos do período filtrado")
 
 colA, colB = st.columns([3,1])
 with colA:
-    st.caption("Edite os valores diretamente na tabela abaixo. As mudanças são salvas em sessão.")
+    st.caption("Edite os valores diretamente na tabela abaixo. As mudanças são gravadas no armazenamento local (Parquet por ano/mês).")
 with colB:
-    csv_data = csv_bytes(df_use[COLS]) if not df_use.empty else b""
-    st.download_button("⬇️ Exportar CSV (filtrado)", data=csv_data, file_name=f"gv_volumes_{ano_sel}-{mes_idx:02d}.csv", mime="text/csv", disabled=df_use.empty)
-
-edited_df = st.data_editor(
-    df_use[COLS],
-    num_rows="dynamic",
-    use_container_width=True,
-    column_config={
-        "Data": st.column_config.DateColumn("Data", format="YYYY-MM-DD"),
-        "Tipo": st.column_config.SelectboxColumn("Tipo", options=["Toras","Cavaco","Lenha"]),
-        "Unidade": st.column_config.SelectboxColumn("Unidade", options=["ST","TN","m3"]),
-        "Status": st.column_config.SelectboxColumn("Status", options=["ok","verificando"]),
-        "Quantidade": st.column_config.NumberColumn("Quantidade", step=0.01, min_value=0.0),
-    },
-    key="editor_filtered",
-)
-
-def apply_back_to_global(original_global: pd.DataFrame, filtered_edited: pd.DataFrame) -> pd.DataFrame:
-    # Define o período atual e substitui pelas linhas editadas
-    mask_period = (
-        (pd.to_datetime(original_global["Data"]).dt.year == ano_sel) &
-        (pd.to_datetime(original_global["Data"]).dt.month == mes_idx)
+    export_control("csv", "⬇️ Exportar CSV (filtrado)", lambda: (df_use[COLS + [ALERT_COL]],),
+                   file_name=f"gv_volumes_{periodo_slug}.csv", mime="text/csv", disabled=df_use.empty)
+
+# Linhas indexadas pelo ID estável; ao salvar, só o que o editor marcou como alterado é gravado.
+# A sessão edita um snapshot preso à versão lida (referência ao frame do cache compartilhado, sem cópia).
+editor_key = f"editor_filtered_{st.session_state.get('editor_nonce', 0)}"
+
+def reset_editor() -> None:
+    # Novo key zera o estado de edição do widget; o próximo rerun prende a versão atual
+    st.session_state.editor_nonce = st.session_state.get("editor_nonce", 0) + 1
+    st.session_state.pop("editor_snapshot", None)
+    st.session_state.pop("editor_conflicts", None)
+
+editor_params = (inicio, fim, tipo_arg, cliente_arg)
+snap = st.session_state.get("editor_snapshot")
+pending = has_pending_edits(st.session_state.get(editor_key))
+if snap is not None and snap.params != editor_params and pending:
+    # Filtro trocado com edição pendente: as posições do editor não valem para as linhas novas
+    reset_editor()
+    editor_key = f"editor_filtered_{st.session_state.editor_nonce}"
+    snap = None
+if snap is None or snap.params != editor_params or (snap.version != repo.version and not pending):
+    snap = EditorSnapshot(editor_params, repo.version, df_use)
+    st.session_state.editor_snapshot = snap
+elif snap.version != repo.version:
+    st.info("Os dados mudaram desde que você começou a editar. Ao salvar, linhas que outra sessão "
+            "alterou ou removeu são apontadas como conflito e nada é gravado.")
+
+# Busca, ordenação e paginação no servidor: só a página atual vai para o navegador e volta no save.
+# Com edição pendente a navegação fica travada, porque o editor guarda as mudanças por posição na página.
+p1, p2, p3, p4 = st.columns([3, 2, 1, 1])
+busca = p1.text_input("Buscar cliente ou ID", key="editor_busca", disabled=pending)
+ordem = p2.selectbox("Ordenar por", SORT_COLS, key="editor_ordem", disabled=pending)
+decrescente = p3.toggle("Decrescente", key="editor_desc", disabled=pending)
+por_pagina = p4.selectbox("Linhas/página", EDITOR_PAGE_SIZES, index=1, key="editor_tam", disabled=pending)
+
+def editor_order():
+    return page_order(snap.rows, busca, ordem, ascending=not decrescente)
+
+# Snapshot preso numa versão antiga não entra no cache (que só guarda a versão atual)
+order = (qcache.get_or_compute(repo.version, ("editor_order", *editor_params, busca, ordem, decrescente), editor_order)
+         if snap.version == repo.version else editor_order())
+n_paginas = max(1, -(-len(order) // por_pagina))
+if st.session_state.get("editor_pagina", 1) > n_paginas:
+    st.session_state.editor_pagina = n_paginas
+pg1, pg2 = st.columns([1, 3])
+pagina = pg1.number_input("Página", min_value=1, max_value=n_paginas, step=1, key="editor_pagina", disabled=pending)
+pg2.caption(f"{len(order)} linha(s) · página {pagina} de {n_paginas}"
+            + (" · salve ou descarte as alterações para mudar de página" if pending else ""))
+
+with prof.stage("editor") as rec:
+    page = page_slice(snap.rows, order, pagina, por_pagina)
+    editor_df = page.set_index(ID_COL)[COLS + [ALERT_COL]].astype({"Cliente": str, ALERT_COL: str})  # texto livre: permite digitar clientes novos
+    st.data_editor(
+        editor_df,
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DateColumn("Data", format="YYYY-MM-DD"),
+            "Tipo": st.column_config.SelectboxColumn("Tipo", options=["Toras","Cavaco","Lenha"]),
+            "Unidade": st.column_config.SelectboxColumn("Unidade", options=["ST","TN","m3"]),
+            "Status": st.column_config.SelectboxColumn("Status", options=["ok","verificando"]),
+            "Quantidade": st.column_config.NumberColumn("Quantidade", step=0.01, min_value=0.0),
+            ALERT_COL: st.column_config.TextColumn(ALERT_COL, disabled=True,
+                                                   help="Motivo das regras automáticas; passe o Status para ok para liberar"),
+        },
+        key=editor_key,
     )
-    if tipo_sel != "Todos":
-        mask_period &= (original_global["Tipo"] == tipo_sel)
-    if cliente_sel != "Todos":
-        mask_period &= (original_global["Cliente"] == cliente_sel)
-    remaining = original_global.loc[~mask_period].copy()
-    merged = pd.concat([remaining, filtered_edited[COLS]], ignore_index=True)
-    return merged
+    rec["linhas"], rec["bytes"] = len(editor_df), arrow_bytes(editor_df)
 
 if st.button("💾 Salvar alterações do período filtrado"):
-    st.session_state.df = apply_back_to_global(st.session_state.df, edited_df[COLS])
-    st.success("Alterações salvas no app (sessão atual).")
+    try:
+        with prof.stage("salvar_edicao"):
+            changes = apply_back_to_global(repo, editor_df, st.session_state.get(editor_key, {}), snap.version)
+    except ConflictError as e:
+        st.session_state.editor_conflicts = e.conflicts
+    else:
+        perf_log.record_run(prof)
+        reset_editor()
+        st.success(f"Alterações salvas: {changes.summary()}.")
+        st.rerun()
+
+if pending and st.button("↩️ Descartar alterações"):
+    reset_editor()
     st.rerun()
 
+conflitos = st.session_state.get("editor_conflicts")
+if conflitos is not None:
+    st.error(f"Nada foi gravado: {len(conflitos)} linha(s) que você editou foram mudadas por outra sessão. "
+             "Valores atuais abaixo; recarregue e refaça a edição.")
+    st.dataframe(conflitos, use_container_width=True, hide_index=True)
+    if st.button("🔄 Descartar minhas alterações e recarregar"):
+        reset_editor()
+        st.rerun()
+
 # ----------------------------- Adicionar novo lançamento -----------------------------
 with st.expander("➕ Adicionar novo lançamento"):
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        nova_data = st.date_input("Data", value=date.today())
-        novo_tipo = st.selectbox("Tipo do produto", ["Toras","Cavaco","Lenha"], index=0, key="novo_tipo")
-    with c2:
-        unidades = UNITS_BY_TIPO[novo_tipo]
-        nova_unidade = st.selectbox("Unidade", unidades, index=0, key="nova_unidade")
-        nova_qtd = st.number_input("Quantidade", min_value=0.0, step=0.01, key="nova_qtd")
-    with c3:
-        novo_cliente = st.text_input("Cliente", key="novo_cliente")
-        novo_status = st.selectbox("Status", ["ok","verificando"], index=0, key="novo_status")
-
-    if st.button("Salvar novo lançamento"):
-        if novo_cliente.strip() == "":
-            st.warning("Informe o nome do cliente.")
-        else:
-            new_row = {
-                "Data": nova_data.strftime("%Y-%m-%d"),
-                "Tipo": novo_tipo,
-                "Cliente": novo_cliente.strip(),
-                "Unidade": nova_unidade,
-                "Quantidade": float(nova_qtd),
-                "Status": novo_status
-            }
-            st.session_state.df.loc[len(st.session_state.df)] = new_row
-            st.success("Registro adicionado!")
+    # Lançamentos entram num buffer tipado e vão para o armazenamento em lotes
+    modo_lote = st.toggle("Modo lote: digitar vários tickets de uma vez", key="modo_lote")
+    if not modo_lote:
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            nova_data = st.date_input("Data", value=date.today())
+            novo_tipo = st.selectbox("Tipo do produto", ["Toras","Cavaco","Lenha"], index=0, key="novo_tipo")
+        with c2:
+            unidades = UNITS_BY_TIPO[novo_tipo]
+            nova_unidade = st.selectbox("Unidade", unidades, index=0, key="nova_unidade")
+            nova_qtd = st.number_input("Quantidade", min_value=0.0, step=0.01, key="nova_qtd")
+        with c3:
+            novo_cliente = st.text_input("Cliente", key="novo_cliente")
+            cadastrado = repo.clients.find(novo_cliente) if novo_cliente.strip() else None
+            if cadastrado is not None and cadastrado != novo_cliente.strip():
+                st.caption(f"Será gravado como **{cadastrado}**.")
+            novo_status = st.selectbox("Status", ["ok","verificando"], index=0, key="novo_status")
+
+        if st.button("Salvar novo lançamento"):
+            if novo_cliente.strip() == "":
+                st.warning("Informe o nome do cliente.")
+            else:
+                new_row = {
+                    "Data": nova_data,
+                    "Tipo": novo_tipo,
+                    "Cliente": novo_cliente.strip(),
+                    "Unidade": nova_unidade,
+                    "Quantidade": float(nova_qtd),
+                    "Status": novo_status
+                }
+                if append_buffer.add(new_row):
+                    st.toast("Registro gravado.")
+                else:
+                    st.toast("Registro recebido; entra na tabela e nos gráficos na próxima gravação em lote.")
+                st.rerun()
+    else:
+        lote_data = st.date_input("Data dos tickets", value=date.today(), key="lote_data")
+        lote_key = f"lote_{st.session_state.get('lote_nonce', 0)}"
+        lote = st.data_editor(
+            pd.DataFrame({c: pd.Series(dtype="float64" if c == "Quantidade" else "object") for c in COLS}),
+            num_rows="dynamic",
+            use_container_width=True,
+            column_config={
+                "Data": st.column_config.DateColumn("Data", format="YYYY-MM-DD", default=lote_data),
+                "Tipo": st.column_config.SelectboxColumn("Tipo", options=["Toras","Cavaco","Lenha"], default="Toras"),
+                "Unidade": st.column_config.SelectboxColumn("Unidade", options=["ST","TN","m3"], default="ST"),
+                "Status": st.column_config.SelectboxColumn("Status", options=["ok","verificando"], default="ok"),
+                "Quantidade": st.column_config.NumberColumn("Quantidade", step=0.01, min_value=0.0),
+            },
+            key=lote_key,
+        )
+        if st.button("Salvar lote", disabled=lote.empty):
+            # Mesma validação do importador de CSV
+            valid, rejects = validate_chunk(lote.astype("string"), UNITS_BY_TIPO)
+            append_buffer.extend(valid)
+            append_buffer.flush()
+            st.session_state.lote_nonce = st.session_state.get("lote_nonce", 0) + 1
+            if rejects.empty:
+                st.success(f"{len(valid)} lançamento(s) gravado(s).")
+                st.rerun()
+            else:
+                st.warning(f"{len(valid)} lançamento(s) gravado(s); {len(rejects)} com problema não foram gravados:")
+                st.dataframe(rejects, use_container_width=True, hide_index=True)
+
+    if len(append_buffer):
+        st.caption(f"{len(append_buffer)} lançamento(s) aguardando gravação em lote "
+                   f"(grava a cada {append_buffer.batch_size} ou após {append_buffer.max_age_s:.0f}s).")
+        if st.button("Gravar pendentes agora"):
+            append_buffer.flush()
             st.rerun()
 
 # ----------------------------- Importar CSV -----------------------------
 st.subheader("📥 Importar CSV")
 st.caption("Formato esperado: Data,Tipo,Cliente,Unidade,Quantidade,Status")
-file = st.file_uploader("Selecione um arquivo CSV", type=["csv"])
+file = st.file_uploader("Selecione um arquivo CSV", type=["csv"], key="import_file")
 if file is not None:
-    try:
-        new = pd.read_csv(file)
-        new = new[[c for c in COLS if c in new.columns]].copy()
-        for c in COLS:
-            if c not in new.columns:
-                if c == "Quantidade":
-                    new[c] = 0.0
-                elif c == "Data":
-                    new[c] = date.today().strftime("%Y-%m-%d")
-                elif c == "Status":
-                    new[c] = "ok"
-                else:
-                    new[c] = ""
-        new["Data"] = pd.to_datetime(new["Data"]).dt.date
-        new["Quantidade"] = pd.to_numeric(new["Quantidade"], errors="coerce").fillna(0.0)
-        new["Status"] = new["Status"].astype(str).str.lower().where(
-            new["Status"].astype(str).str.lower().isin(["ok","verificando"]), "ok"
+    # O arquivo continua anexado depois do rerun: o hash do conteúdo evita processá-lo de novo
+    sha = file_sha256(file)
+    previous = import_ledger.get(sha)
+    if previous is not None:
+        if st.session_state.get("import_report", {}).get("sha") != sha:
+            st.info(f"Este arquivo já foi importado em {previous['importado_em']} "
+                    f"({previous['arquivo']}); nada foi gravado de novo.")
+    else:
+        # Lê em blocos com validação vetorizada; linhas novas são gravadas a cada bloco e as já existentes são ignoradas ou atualizadas
+        bar = st.progress(0.0, text="Importando…")
+        last = {}
+        def on_progress(frac: float, res: ImportResult) -> None:
+            last["result"] = res
+            bar.progress(frac, text=f"Importando… {res.written.new} nova(s), {res.written.duplicate} duplicada(s), "
+                                    f"{res.written.updated} atualizada(s), {res.rows_rejected} rejeitada(s)")
+        try:
+            with prof.stage("importar_csv") as rec:
+                rec["bytes"] = file.size
+                result = import_csv(file, repo.upsert, UNITS_BY_TIPO, total_bytes=file.size, progress=on_progress)
+                rec["linhas"] = result.rows_read
+        except Exception as e:
+            done = last["result"].written.new if "result" in last else 0
+            st.error(f"Falha ao importar: {e} ({done} linha(s) já gravada(s))")
+        else:
+            perf_log.record_run(prof)
+            import_ledger.record(sha, file.name, result)
+            rejects = result.rejects_frame()
+            st.session_state.import_report = {
+                "sha": sha,
+                "arquivo": file.name,
+                "novas": result.written.new,
+                "duplicadas": result.written.duplicate,
+                "atualizadas": result.written.updated,
+                "sinalizadas": result.written.flagged,
+                "rejeitadas": len(rejects),
+                "rejects_csv": csv_bytes(rejects) if not rejects.empty else b"",
+            }
+            st.rerun()
+
+report = st.session_state.get("import_report")
+if report:
+    st.success(f"{report['arquivo']}: {report['novas']} nova(s), {report['duplicadas']} duplicada(s) ignorada(s), "
+               f"{report['atualizadas']} atualizada(s); {report['rejeitadas']} rejeitada(s).")
+    if report.get("sinalizadas"):
+        st.warning(f"{report['sinalizadas']} linha(s) gravada(s) como \"verificando\" pelas regras automáticas "
+                   f"(veja a coluna {ALERT_COL} na tabela).")
+    if report["rejeitadas"]:
+        st.download_button(
+            "⬇️ Baixar relatório de rejeitadas (CSV)",
+            data=report["rejects_csv"],
+            file_name=f"rejeitadas_{report['arquivo']}",
+            mime="text/csv",
         )
 
-        st.session_state.df = pd.concat([st.session_state.df, new[COLS]], ignore_index=True)
-        st.success(f"Importado {len(new)} linha(s)!")
+# ----------------------------- Regras automáticas -----------------------------
+with st.expander("🔎 Regras automáticas de verificação"):
+    st.caption("Lançamentos novos e editados passam por regras que marcam Status \"verificando\" e explicam o motivo "
+               f"na coluna {ALERT_COL}: unidade fora do padrão do tipo, data futura, ticket duplicado e quantidade "
+               f"a mais de {Z_LIMIT:g} desvios da média do cliente nos {HISTORY_DAYS} dias antes do ticket. "
+               "Passar o Status para ok libera a linha de vez.")
+    if st.button("Reverificar todo o histórico"):
+        n = repo.recheck()
+        st.session_state.recheck_result = n
+        st.rerun()
+    if "recheck_result" in st.session_state:
+        st.info(f"Última reverificação: {st.session_state.recheck_result} linha(s) sinalizada(s).")
+
+# ----------------------------- Cadastro de clientes -----------------------------
+with st.expander("🏷️ Cadastro de clientes (grafias e apelidos)"):
+    st.caption("Nomes são comparados sem acentos, pontuação, maiúsculas e espaços extras. "
+               "Grafias diferentes do mesmo cliente podem ser unificadas ou registradas como apelido.")
+    st.dataframe(repo.clients.table(), use_container_width=True, hide_index=True)
+    u1, u2 = st.columns(2)
+    with u1:
+        variante = st.selectbox("Unificar a grafia", clientes_all, key="cad_variante")
+        destino = st.selectbox("no cliente", clientes_all, key="cad_destino")
+        if st.button("Unificar", disabled=not clientes_all or variante == destino):
+            repo.merge_client(variante, destino)
+            st.rerun()
+    with u2:
+        apelido = st.text_input("Novo apelido", key="cad_apelido")
+        apelido_de = st.selectbox("para o cliente", clientes_all, key="cad_apelido_de")
+        if st.button("Registrar apelido", disabled=not apelido.strip() or not clientes_all):
+            if repo.clients.find(apelido) is not None:
+                st.warning(f"“{apelido}” já corresponde a {repo.clients.find(apelido)}.")
+            else:
+                repo.clients.add_alias(apelido, apelido_de)
+                st.rerun()
+
+# ----------------------------- Fatores de conversão -----------------------------
+with st.expander("📐 Fatores de conversão de unidades"):
+    st.caption("Fator = m³ de referência por 1 unidade; só a razão entre unidades do mesmo Tipo importa. "
+               "Com Cliente preenchido, o fator vale só para aquele cliente (ex.: densidade própria).")
+    fatores = st.data_editor(
+        conversions.frame(),
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Tipo": st.column_config.SelectboxColumn("Tipo", options=TIPOS, required=True),
+            "Unidade": st.column_config.SelectboxColumn("Unidade", options=UNIDADES, required=True),
+            "Cliente": st.column_config.SelectboxColumn("Cliente", options=[""] + clientes_all),
+            "Fator": st.column_config.NumberColumn("Fator", min_value=0.0001, format="%.4f", required=True),
+        },
+        key=f"fatores_{conversions.version}",
+    )
+    if st.button("💾 Salvar fatores"):
+        conversions.replace(fatores)
         st.rerun()
-    except Exception as e:
-        st.error(f"Falha ao importar: {e}")
 
 # ----------------------------- Exportar IMAGEM (quadro + ranking) -----------------------------
 st.markdown("---")
 st.subheader("🖼️ Exportar imagem do quadro de clientes (ranking)")
 st.caption("Gera um PNG com o ranking de clientes (tabela e gráfico) para compartilhar em grupos/e-mail.")
 
-def build_share_image(bar_df: pd.DataFrame, title: str) -> bytes:
-    if bar_df.empty:
-        bar_df = pd.DataFrame({"Cliente": ["—"], "Quantidade": [0]})
-
-    # Ordena por quantidade desc
-    bar_df = bar_df.sort_values("Quantidade", ascending=False).reset_index(drop=True)
-
-    # Figura
-    fig = plt.figure(figsize=(10, 8), dpi=200)
-    fig.suptitle(title, fontsize=14, y=0.97)
-
-    # Subplot 1: Tabela
-    ax_table = fig.add_axes([0.06, 0.58, 0.88, 0.34])  # [left, bottom, width, height]
-    ax_table.axis('off')
-    table_data = [["Cliente", "Quantidade"]] + bar_df.values.tolist()
-    table = ax_table.table(cellText=table_data, loc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(8)
-    table.scale(1, 1.3)
-
-    # Subplot 2: Gráfico de barras
-    ax_bar = fig.add_axes([0.08, 0.08, 0.84, 0.42])
-    ax_bar.bar(bar_df["Cliente"], bar_df["Quantidade"])
-    ax_bar.set_ylabel("Quantidade")
-    ax_bar.set_xticklabels(bar_df["Cliente"], rotation=20, ha="right")
-
-    # Render para bytes
-    buf = io.BytesIO()
-    canvas = FigureCanvas(fig)
-    canvas.print_png(buf)
-    plt.close(fig)
-    return buf.getvalue()
-
-rank_title = f"G&V • Ranking por Cliente — {MESES[mes_idx-1].upper()}/{ano_sel}"
-png_bytes = build_share_image(bar_data[["Cliente","Quantidade"]] if not df_use.empty else pd.DataFrame(columns=["Cliente","Quantidade"]), rank_title)
-
-st.download_button(
-    "⬇️ Exportar imagem (PNG) do ranking",
-    data=png_bytes,
-    file_name=f"gv_ranking_{ano_sel}-{mes_idx:02d}.png",
-    mime="image/png",
-    disabled=df_use.empty
-)
+rank_title = ranking_title(periodo_label) + (f" ({unit_arg})" if unit_arg else "")
+export_control("png", "⬇️ Exportar imagem (PNG) do ranking", lambda: (bar_data[["Cliente","Quantidade"]], rank_title),
+               file_name=f"gv_ranking_{periodo_slug}.png", mime="image/png", disabled=df_use.empty)
 
 # ----------------------------- Rodapé -----------------------------
 st.markdown("---")
-st.caption("POC • G&V • Dados em sessão do Streamlit. Para persistência real (Google Sheets/Firestore) e agendamento de envios automáticos por e-mail/WhatsApp, posso integrar quando quiser.")
+st.caption(f"POC • G&V • Dados gravados em `{DATA_DIR}/` (Parquet particionado por ano/mês). Para persistência real (Google Sheets/Firestore) e agendamento de envios automáticos por e-mail/WhatsApp, posso integrar quando quiser.")
+
+# ----------------------------- Desempenho (admin) -----------------------------
+perf_log.record_run(prof)
+if os.environ.get("GV_ADMIN") == "1" or st.query_params.get("admin") == "1":
+    with st.sidebar:
+        st.markdown("---")
+        if st.toggle("⏱️ Painel de desempenho", key="perf_panel"):
+            st.caption(f"Este rerun: {prof.total_ms():.0f} ms (sessão {prof.session})")
+            st.dataframe(prof.frame(), use_container_width=True, hide_index=True)
+            st.caption(f"Todas as sessões (log `{perf_log.path}`):")
+            st.dataframe(perf_log.summary(), use_container_width=True, hide_index=True)
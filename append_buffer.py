@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from table import COLS, normalize
+
+APPEND_BATCH_SIZE = 200
+APPEND_MAX_AGE_S = 60.0
+
+
+class AppendBuffer:
+    """Buffer tipado de lançamentos novos, gravado no repositório em lotes.
+
+    Cada `add` só acrescenta valores às listas de colunas (sem mexer na tabela
+    principal); o lote vai para o armazenamento quando atinge `batch_size`,
+    quando o lançamento mais antigo passa de `max_age_s` ou num `flush` explícito.
+
+    Com `path`, cada lançamento também vai para um arquivo JSON lines antes de
+    entrar no buffer; o arquivo é zerado só depois que o lote foi gravado, e o que
+    sobrou nele (processo reiniciado, gravação que falhou) volta ao buffer na criação.
+    """
+
+    def __init__(self, write: Callable[[pd.DataFrame], int], path: str | os.PathLike | None = None,
+                 batch_size: int = APPEND_BATCH_SIZE, max_age_s: float = APPEND_MAX_AGE_S):
+        self._write = write
+        self.path = Path(path) if path is not None else None
+        self.batch_size = batch_size
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        self._reset()
+        self._replay()
+
+    def _reset(self) -> None:
+        self._data: list[np.datetime64] = []
+        self._text: dict[str, list[str]] = {c: [] for c in ("Tipo", "Cliente", "Unidade", "Status")}
+        self._qtd: list[float] = []
+        self._since: float | None = None
+
+    def _replay(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        for line in self.path.read_text("utf-8").splitlines():
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # linha cortada por uma queda no meio da escrita
+            self._push(np.datetime64(row["Data"], "D"), float(row["Quantidade"]), row)
+        if self._qtd:
+            # Pendentes de antes do reinício: já vencidos, vão no próximo flush_if_due
+            self._since = time.monotonic() - self.max_age_s
+
+    def __len__(self) -> int:
+        return len(self._qtd)
+
+    def _push(self, data: np.datetime64, qtd: float, row: dict) -> None:
+        self._data.append(data)
+        self._qtd.append(qtd)
+        for c, values in self._text.items():
+            values.append(str(row.get(c, "ok" if c == "Status" else "")).strip())
+        if self._since is None:
+            self._since = time.monotonic()
+
+    def add(self, row: dict) -> int:
+        # Converte na entrada: a coluna Data nunca recebe texto misturado com datas
+        data = np.datetime64(pd.Timestamp(row["Data"]).normalize(), "D")
+        qtd = float(row["Quantidade"])
+        if qtd < 0:
+            raise ValueError("Quantidade não pode ser negativa.")
+        with self._lock:
+            if self.path is not None:
+                record = {c: str(row.get(c, "ok" if c == "Status" else "")).strip() for c in self._text}
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"Data": str(data), "Quantidade": qtd, **record}, ensure_ascii=False) + "\n")
+            self._push(data, qtd, row)
+        return self.flush_if_due()
+
+    def extend(self, rows: pd.DataFrame) -> int:
+        for row in rows[COLS].to_dict("records"):
+            self.add(row)
+        return self.flush_if_due()
+
+    def _frame(self) -> pd.DataFrame:
+        return normalize(pd.DataFrame({
+            "Data": np.array(self._data, dtype="datetime64[D]"),
+            **self._text,
+            "Quantidade": np.array(self._qtd, dtype="float64"),
+        })[COLS])
+
+    def flush_if_due(self) -> int:
+        due = len(self) >= self.batch_size or (
+            self._since is not None and time.monotonic() - self._since >= self.max_age_s)
+        return self.flush() if due else 0
+
+    def flush(self) -> int:
+        # O lock fica com o lote até a gravação terminar: se ela falhar, nada sai do buffer
+        # nem do arquivo, e o próximo flush tenta de novo
+        with self._lock:
+            if not self._qtd:
+                return 0
+            written = self._write(self._frame())
+            self._reset()
+            if self.path is not None:
+                self.path.unlink(missing_ok=True)
+        return written
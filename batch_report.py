@@ -0,0 +1,165 @@
+"""Gera, sem navegador, os rankings (PNG) e CSVs filtrados de vários meses e combinações Tipo/Cliente.
+
+Exemplo (fechamento do mês para cada cliente):
+
+    python batch_report.py --de 2025-01 --ate 2025-07 --tipo Todos --por-cliente --saida relatorios/
+
+Usa o mesmo filtro, ranking e renderização do app; os trabalhos são distribuídos
+entre os núcleos com um pool de processos e o resultado é descrito em manifest.json.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from exports import build_share_image, csv_bytes
+from queries import build_period_view, month_bounds, month_label, ranking_title
+from storage import LedgerRepository
+from table import COLS, TIPOS, UNIDADES, LedgerTable
+from units import ConversionTable
+
+TODOS = "Todos"
+ORIGINAL = "original"
+
+# Estado de cada processo do pool
+_repo: LedgerRepository | None = None
+_factors = None
+_unit: str | None = None
+
+
+def _init_worker(data_dir: str, unit: str) -> None:
+    global _repo, _factors, _unit
+    _repo = LedgerRepository(data_dir)
+    _factors = ConversionTable(Path(data_dir) / "_conversoes.json").frame()
+    _unit = None if unit == ORIGINAL else unit
+
+
+@lru_cache(maxsize=4)
+def _month_table(ano: int, mes: int) -> LedgerTable:
+    # Vários trabalhos do mesmo mês caem no mesmo processo com frequência: lê a partição uma vez
+    return LedgerTable(_repo.load(ano, mes), normalized=True)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "-", text).strip("-").lower() or "x"
+
+
+def render_job(job: dict, out_dir: str) -> dict:
+    ano, mes, tipo, cliente = job["ano"], job["mes"], job["tipo"], job["cliente"]
+    inicio, fim = month_bounds(ano, mes)
+    view = build_period_view(
+        _month_table(ano, mes), _repo.rollup(ano, mes), inicio, fim,
+        tipo=None if tipo == TODOS else tipo, cliente=None if cliente == TODOS else cliente,
+        factors=_factors, unit=_unit,
+    )
+    stem = f"gv_{ano}-{mes:02d}_{_slug(tipo)}_{_slug(cliente)}"
+    title = ranking_title(month_label(ano, mes)) + (f" ({_unit})" if _unit else "")
+    if tipo != TODOS or cliente != TODOS:
+        title += f" ({' / '.join(x for x in (tipo, cliente) if x != TODOS)})"
+
+    files = {}
+    for kind, data in (("png", build_share_image(view.ranking[["Cliente","Quantidade"]], title)),
+                       ("csv", csv_bytes(view.rows[COLS]))):
+        path = Path(out_dir) / f"{stem}.{kind}"
+        path.write_bytes(data)
+        files[kind] = {"arquivo": path.name, "bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    return {
+        **job,
+        "linhas": len(view.rows),
+        "unidade": _unit or ORIGINAL,
+        "total": float(view.ranking["Quantidade"].sum()),
+        "sem_fator": view.unconverted,
+        **files,
+    }
+
+
+def _months(de: str, ate: str) -> list[tuple[int, int]]:
+    a0, m0 = map(int, de.split("-"))
+    a1, m1 = map(int, ate.split("-"))
+    out = []
+    while (a0, m0) <= (a1, m1):
+        out.append((a0, m0))
+        a0, m0 = (a0 + 1, 1) if m0 == 12 else (a0, m0 + 1)
+    return out
+
+
+def plan_jobs(repo: LedgerRepository, months: list[tuple[int, int]], tipos: list[str],
+              clientes: list[str], por_cliente: bool) -> list[dict]:
+    jobs = []
+    for (ano, mes), tipo in itertools.product(months, tipos):
+        if por_cliente:
+            # Só os clientes com lançamentos no mês (e no Tipo): o cadastro inteiro geraria relatórios vazios
+            cube = repo.rollup(ano, mes)
+            if tipo != TODOS:
+                cube = cube[cube["Tipo"] == tipo]
+            present = set(cube["Cliente"].astype(str))
+            clientes = [TODOS] + [c for c in repo.clientes() if c in present]
+        jobs += [{"ano": ano, "mes": mes, "tipo": tipo, "cliente": cliente} for cliente in clientes]
+    return jobs
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dados", default=os.environ.get("GV_DATA_DIR", "dados"), help="pasta do armazenamento")
+    parser.add_argument("--de", required=True, help="primeiro mês (AAAA-MM)")
+    parser.add_argument("--ate", help="último mês (AAAA-MM); padrão: igual a --de")
+    parser.add_argument("--tipo", nargs="+", default=[TODOS], choices=[TODOS] + TIPOS)
+    parser.add_argument("--cliente", nargs="+", default=[TODOS], help='clientes; "Todos" = sem filtro')
+    parser.add_argument("--unidade", default="ST", choices=UNIDADES + [ORIGINAL],
+                        help='unidade do ranking; "original" soma sem converter')
+    parser.add_argument("--por-cliente", action="store_true", help="um relatório para cada cliente com lançamentos no mês")
+    parser.add_argument("--saida", default="relatorios", help="pasta de saída")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processos em paralelo")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.saida)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    repo = LedgerRepository(args.dados)
+    months = _months(args.de, args.ate or args.de)
+    # Materializa os cubos antes de abrir o pool, para os processos só lerem
+    for ano, mes in months:
+        repo.rollup(ano, mes)
+
+    # Cada grafia vira o nome do cadastro (o filtro compara com ele); nomes desconhecidos vão para os erros
+    results, errors, clientes = [], [], []
+    for nome in args.cliente:
+        canonical = nome if nome == TODOS else repo.clients.find(nome)
+        if canonical is None:
+            errors += [{"ano": ano, "mes": mes, "tipo": tipo, "cliente": nome, "erro": "cliente não cadastrado"}
+                       for (ano, mes), tipo in itertools.product(months, args.tipo)]
+        elif canonical not in clientes:
+            clientes.append(canonical)
+    jobs = plan_jobs(repo, months, args.tipo, clientes, args.por_cliente)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.dados, args.unidade)) as pool:
+        futures = {pool.submit(render_job, job, str(out_dir)): job for job in jobs}
+        for i, fut in enumerate(as_completed(futures), 1):
+            job = futures[fut]
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                errors.append({**job, "erro": str(e)})
+            print(f"\r{i}/{len(jobs)} relatório(s)", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    key = lambda r: (r["ano"], r["mes"], r["tipo"], r["cliente"])
+    manifest = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "dados": str(Path(args.dados).resolve()),
+        "relatorios": sorted(results, key=key),
+        "erros": sorted(errors, key=key),
+    }
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=1), "utf-8")
+    print(f"{len(results)} relatório(s) em {out_dir}/ ({len(errors)} erro(s)); veja manifest.json", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Mede, sem navegador, as etapas do app sobre livros sintéticos e compara com uma linha de base.
+
+Exemplo (grava a linha de base da máquina e depois confere contra ela):
+
+    python benchmark.py --tamanhos 10000 100000 1000000 --gravar-baseline
+    python benchmark.py --tamanhos 10000 100000 1000000
+
+Para cada tamanho o livro é gerado por synthetic.py num armazenamento temporário. Cada
+etapa roda --repeticoes vezes (vale o menor tempo) e mais uma vez sob tracemalloc para
+o pico de memória. Sai com código 1 se alguma etapa passar da linha de base mais a
+tolerância, ou se faltar linha de base para algum tamanho/etapa medido (a menos que
+--sem-baseline seja passado); a linha de base é da máquina em que foi gravada.
+"""
+import argparse
+import itertools
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from editing import apply_back_to_global
+from exports import build_share_image, csv_bytes
+from importer import import_csv
+from queries import (client_ranking, cumulative_series, downsample_cumulative, filter_rollup, month_bounds,
+                     month_label, ranking_title)
+from storage import LedgerRepository
+from synthetic import SYNTH_CHUNK_ROWS, generate
+from table import ALERT_COL, COLS, ID_COL, UNITS_BY_TIPO, LedgerTable
+from units import ConversionTable, convert
+
+BASELINE_FILE = "bench_baseline.json"
+CHART_MAX_POINTS = 400
+BENCH_EDITS = 50
+# Folga absoluta somada à tolerância relativa: etapas de poucos ms oscilam mais que 25%
+SLACK_MS = 5.0
+SLACK_KB = 1024
+
+
+class Stage:
+    """Uma etapa medida: `setup` prepara os argumentos fora do cronômetro, `run` é o que se mede."""
+
+    def __init__(self, name: str, run: Callable, setup: Callable[[], tuple] = tuple):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+def _timed(stage: Stage, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        args = stage.setup()
+        t0 = time.perf_counter()
+        stage.run(*args)
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 2)
+
+
+def _peak_kb(stage: Stage) -> int:
+    args = stage.setup()
+    tracemalloc.start()
+    try:
+        stage.run(*args)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def build_stages(repo: LedgerRepository, ledger: pd.DataFrame, work: Path) -> list[Stage]:
+    """Etapas do app sobre `repo`, na ordem de um rerun típico (último mês, cliente mais frequente)."""
+    first, last = ledger["Data"].min(), ledger["Data"].max()
+    inicio, fim = month_bounds(last.year, last.month)
+    cliente = ledger["Cliente"].value_counts().index[0]
+    tipo = ledger.loc[ledger["Cliente"] == cliente, "Tipo"].mode()[0]
+    factors = ConversionTable(work / "_conversoes.json").frame()
+
+    table = LedgerTable(repo.load_range(first, last), normalized=True)
+    cube = repo.rollup_range(first, last)
+    month_rows = table.filter_range(inicio, fim)
+    ranking = client_ranking(convert(cube, factors, "ST")[0])
+    title = ranking_title(month_label(last.year, last.month))
+
+    csv_path = work / "importar.csv"
+    ledger.assign(Data=ledger["Data"].dt.strftime("%Y-%m-%d")).to_csv(csv_path, index=False)
+    import_dirs = itertools.count()
+
+    def edit_setup() -> tuple:
+        # Como o editor: página do mês (indexada por ID) e BENCH_EDITS quantidades alteradas
+        page = repo.load(last.year, last.month).head(BENCH_EDITS)
+        shown = page.set_index(ID_COL)[COLS + [ALERT_COL]].astype({"Cliente": str, ALERT_COL: str})
+        state = {"edited_rows": {i: {"Quantidade": float(q) + 1.0} for i, q in enumerate(shown["Quantidade"])}}
+        return repo, shown, state, repo.version
+
+    def import_setup() -> tuple:
+        # Cada repetição importa num armazenamento vazio, para medir sempre o mesmo trabalho
+        return open(csv_path, "rb"), LedgerRepository(work / f"importacao_{next(import_dirs)}")
+
+    def import_run(file, target: LedgerRepository) -> None:
+        with file:
+            import_csv(file, target.upsert, UNITS_BY_TIPO)
+
+    return [
+        Stage("carregar", lambda: LedgerTable(repo.load_range(first, last), normalized=True)),
+        Stage("filtrar", lambda: table.filter_range(inicio, fim, tipo=tipo, cliente=cliente)),
+        Stage("acumulado", lambda: downsample_cumulative(cumulative_series(filter_rollup(cube, tipo=tipo)),
+                                                         CHART_MAX_POINTS)),
+        Stage("ranking", lambda: client_ranking(convert(cube, factors, "ST")[0])),
+        Stage("salvar_edicao", apply_back_to_global, edit_setup),
+        Stage("importar_csv", import_run, import_setup),
+        Stage("csv_bytes", lambda: csv_bytes(month_rows[COLS + [ALERT_COL]])),
+        Stage("png", lambda: build_share_image(ranking[["Cliente", "Quantidade"]], title)),
+    ]
+
+
+def run_size(rows: int, repeats: int, seed: int) -> dict[str, dict]:
+    with tempfile.TemporaryDirectory(prefix="gv_bench_") as tmp:
+        work = Path(tmp)
+        ledger = generate(rows, seed=seed)
+        repo = LedgerRepository(work / "dados")
+        for i in range(0, len(ledger), SYNTH_CHUNK_ROWS):
+            repo.append(ledger.iloc[i:i + SYNTH_CHUNK_ROWS])
+        out = {}
+        for stage in build_stages(repo, ledger, work):
+            out[stage.name] = {"ms": _timed(stage, repeats), "pico_kb": _peak_kb(stage)}
+            print(f"  {rows:>10} {stage.name:<14} {out[stage.name]['ms']:>10.2f} ms "
+                  f"{out[stage.name]['pico_kb']:>10} kB", file=sys.stderr)
+        return out
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, require: bool = True) -> list[str]:
+    """Etapas acima de base * (1 + tolerância) + folga; com `require`, etapas sem linha de base também falham."""
+    out = []
+    for size, stages in results.items():
+        for name, cur in stages.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                if require:
+                    out.append(f"{size} linhas / {name}: sem linha de base")
+                continue
+            for key, slack, unit in (("ms", SLACK_MS, "ms"), ("pico_kb", SLACK_KB, "kB")):
+                limit = base[key] * (1 + tolerance) + slack
+                if cur[key] > limit:
+                    out.append(f"{size} linhas / {name}: {cur[key]:.1f} {unit} > limite {limit:.1f} {unit} "
+                               f"(base {base[key]:.1f})")
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000], help="linhas de cada livro")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora relativa aceita (0.25 = 25%%)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--gravar-baseline", action="store_true", help="grava os resultados como nova linha de base")
+    parser.add_argument("--sem-baseline", action="store_true",
+                        help="só mede: não falha por falta de linha de base (arquivo, tamanho ou etapa)")
+    args = parser.parse_args(argv)
+
+    path = Path(args.baseline)
+    if not (args.gravar_baseline or args.sem_baseline or path.exists()):
+        # Sem linha de base não há o que comparar: falha antes de gastar minutos medindo
+        print(f"Sem linha de base em {path}: rode com --gravar-baseline (ou --sem-baseline para só medir)",
+              file=sys.stderr)
+        return 2
+
+    results = {}
+    for rows in args.tamanhos:
+        results[str(rows)] = run_size(rows, args.repeticoes, args.semente)
+    report = pd.DataFrame([{"linhas": int(size), "etapa": name, **r}
+                           for size, stages in results.items() for name, r in stages.items()])
+    with pd.option_context("display.width", 200):
+        print(report.to_string(index=False))
+
+    if args.gravar_baseline:
+        baseline = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        path.write_text(json.dumps({**baseline, **results}, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Linha de base gravada em {path}", file=sys.stderr)
+        return 0
+    baseline = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    failed = regressions(results, baseline, args.tolerancia, require=not args.sem_baseline)
+    for msg in failed:
+        print(f"REGRESSÃO {msg}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+# Artefatos maiores que o limite da LRU mantidos em disco (os mais recentes)
+MAX_SPILLED = 8
+
+
+class LRUCache:
+    """Cache LRU limitado por número de entradas, seguro entre threads."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Calcula fora do lock para não travar outras sessões
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class QueryCache(LRUCache):
+    """Resultados de consulta chaveados por (versão dos dados, parâmetros).
+
+    Quando chega uma versão mais nova, tudo o que foi calculado sobre a anterior
+    é descartado de uma vez. Uma sessão que ainda lê uma versão antiga recebe o
+    resultado calculado, mas ele não é guardado (nem esvazia o cache das outras).
+    """
+
+    def __init__(self, maxsize: int = 128):
+        super().__init__(maxsize)
+        self.version: int | None = None
+
+    def get_or_compute(self, version: int, params: tuple, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            if self.version is None or version > self.version:
+                self.clear()
+                self.version = version
+            elif version < self.version:
+                return fn()
+        return super().get_or_compute((version, *params), fn)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            # O cálculo terminou depois que a versão avançou: não guarda resultado velho
+            if key[0] == self.version:
+                super().put(key, value)
+
+
+class ContentCache:
+    """Cache de artefatos (bytes) endereçado por hash de conteúdo e limitado em bytes.
+
+    Um artefato maior que o limite inteiro (o CSV de um período longo) não caberia
+    na LRU: vai para um arquivo temporário, e os MAX_SPILLED mais recentes ficam
+    disponíveis para download.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_spilled: int = MAX_SPILLED):
+        self.max_bytes = max_bytes
+        self.max_spilled = max_spilled
+        self.nbytes = 0
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+        self._spilled: OrderedDict[str, Path] = OrderedDict()
+        self._dir: Path | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._spilled)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data or key in self._spilled
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+            path = self._spilled.get(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None  # despejado por um artefato mais novo enquanto era lido
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            self._spill(key, value)
+            return
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= len(self._data.pop(key))
+            self._data[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, old = self._data.popitem(last=False)
+                self.nbytes -= len(old)
+
+    def _spill(self, key: str, value: bytes) -> None:
+        with self._lock:
+            if self._dir is None:
+                self._dir = Path(tempfile.mkdtemp(prefix="gv_export_"))
+                atexit.register(shutil.rmtree, self._dir, ignore_errors=True)
+            path = self._dir / key
+        path.write_bytes(value)
+        with self._lock:
+            self._spilled[key] = path
+            self._spilled.move_to_end(key)
+            while len(self._spilled) > self.max_spilled:
+                _, old = self._spilled.popitem(last=False)
+                old.unlink(missing_ok=True)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def name_keys(names: pd.Series) -> pd.Series:
+    # Chave de comparação: sem acentos, sem pontuação, minúsculas e espaços simples
+    # ("Bunge  Rondonópolis." e "bunge rondonopolis" caem na mesma chave)
+    return (names.astype(str).str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+            .str.casefold().str.replace(r"[^\w\s]", " ", regex=True).str.split().str.join(" "))
+
+
+class ClientRegistry:
+    """Cadastro de clientes: nome normalizado e apelidos -> ID inteiro.
+
+    Persistido em JSON (`_clientes.json`). Um cliente unificado a outro guarda o
+    destino e passa a resolver para ele; o arquivo Parquet continua com o ID antigo,
+    mas a leitura devolve o nome do destino.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        data = json.loads(self.path.read_text("utf-8")) if self.path.exists() else {"clientes": []}
+        self._rows: dict[int, dict] = {int(r["id"]): r for r in data["clientes"]}
+        self._rebuild()
+
+    # ----------------------------- Consulta -----------------------------
+    def names(self) -> list[str]:
+        # Lista pronta (ordenada) para o seletor de clientes
+        return list(self._index[1])
+
+    def table(self) -> pd.DataFrame:
+        rows = sorted(self._rows.values(), key=lambda r: r["nome"].casefold())
+        return pd.DataFrame({
+            "ID": [r["id"] for r in rows],
+            "Nome": [r["nome"] for r in rows],
+            "Apelidos": [", ".join(r["apelidos"]) for r in rows],
+            "Unificado em": [self._rows[r["destino"]]["nome"] if r.get("destino") else "" for r in rows],
+        })
+
+    def find(self, nome: str) -> str | None:
+        # Nome de cadastro para uma grafia, sem registrar nada
+        i = self._index[0].get(name_keys(pd.Series([nome])).iloc[0])
+        return None if i is None else self._rows[i]["nome"]
+
+    def ids_of(self, nome: str) -> list[int]:
+        # Todos os IDs gravados que resolvem para este cliente (ele e os unificados nele)
+        by_key, _, code_of_id = self._index
+        target = by_key.get(name_keys(pd.Series([nome])).iloc[0])
+        return [] if target is None else np.flatnonzero(code_of_id == code_of_id[target]).tolist()
+
+    def decode(self, ids: pd.Series | np.ndarray) -> pd.Categorical:
+        _, categories, code_of_id = self._index
+        return pd.Categorical.from_codes(code_of_id[np.asarray(ids, dtype="int64")], categories=categories)
+
+    # ----------------------------- Cadastro -----------------------------
+    def intern(self, names: pd.Series) -> np.ndarray:
+        """IDs (int32) dos nomes; nomes que não casam com nenhum cadastro viram clientes novos.
+
+        O trabalho de texto é feito uma vez por nome distinto, não por linha.
+        """
+        codes, uniques = pd.factorize(pd.Series(names).astype(str), sort=False)
+        keys = name_keys(pd.Series(uniques))
+        with self._lock:
+            by_key = self._index[0]
+            ids = [by_key.get(k) for k in keys]
+            novos = [i for i, v in enumerate(ids) if v is None]
+            if novos:
+                next_id = max(self._rows, default=0) + 1
+                added: dict[str, int] = {}
+                for i in novos:
+                    if keys.iloc[i] not in added:
+                        self._rows[next_id] = {"id": next_id, "nome": " ".join(str(uniques[i]).split()), "apelidos": []}
+                        added[keys.iloc[i]] = next_id
+                        next_id += 1
+                    ids[i] = added[keys.iloc[i]]
+                self._save()
+        return np.asarray(ids, dtype="int32")[codes]
+
+    def canonical(self, names: pd.Series) -> pd.Series:
+        # Nome de cadastro de cada linha (categoria), registrando os novos
+        return pd.Series(self.decode(self.intern(names)), index=names.index, name=names.name)
+
+    def add_alias(self, apelido: str, nome: str) -> None:
+        with self._lock:
+            target = self._resolve(int(self.intern(pd.Series([nome]))[0]))
+            self._rows[target]["apelidos"].append(" ".join(apelido.split()))
+            self._save()
+
+    def merge(self, variante: str, destino: str) -> None:
+        # Variante passa a resolver para o destino (grafias que já estão gravadas)
+        with self._lock:
+            src, dst = (self._resolve(int(i)) for i in self.intern(pd.Series([variante, destino])))
+            if src == dst:
+                return
+            self._rows[src]["destino"] = dst
+            self._save()
+
+    # ----------------------------- Interno -----------------------------
+    def _resolve(self, i: int) -> int:
+        while self._rows[i].get("destino"):
+            i = self._rows[i]["destino"]
+        return i
+
+    def _rebuild(self) -> None:
+        # Monta tudo em variáveis locais e publica numa atribuição só: as leituras (sem lock)
+        # pegam `_index` inteiro, nunca um dicionário novo com categorias antigas
+        spellings = [(n, i) for i, r in self._rows.items() for n in (r["nome"], *r["apelidos"])]
+        keys = name_keys(pd.Series([n for n, _ in spellings], dtype=object))
+        by_key: dict[str, int] = {k: self._resolve(i) for k, (_, i) in zip(keys, spellings)}
+        active = sorted({self._rows[self._resolve(i)]["nome"] for i in self._rows})
+        position = {nome: p for p, nome in enumerate(active)}
+        code_of_id = np.full(max(self._rows, default=0) + 1, -1, dtype="int64")
+        for i in self._rows:
+            code_of_id[i] = position[self._rows[self._resolve(i)]["nome"]]
+        self._index: tuple[dict[str, int], pd.Index, np.ndarray] = (by_key, pd.Index(active), code_of_id)
+
+    def _save(self) -> None:
+        self._rebuild()
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"clientes": list(self._rows.values())}, ensure_ascii=False, indent=1), "utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from table import COLS, ID_COL
+
+# Valores usados quando uma linha nova do editor chega com colunas em branco
+NEW_ROW_DEFAULTS = {"Quantidade": 0.0, "Status": "ok"}
+# Só a página visível vai para o navegador
+EDITOR_PAGE_SIZES = [50, 100, 250, 500]
+SORT_COLS = ["Data", "Cliente", "Quantidade", "Tipo", "Status", ID_COL]
+
+
+@dataclass(frozen=True)
+class EditorChanges:
+    updated: pd.DataFrame   # ID + COLS, já com os valores novos
+    added: pd.DataFrame     # COLS
+    deleted: list[int]      # IDs removidos
+    before: pd.DataFrame    # linhas originais (ID + colunas exibidas) das atualizadas e removidas
+
+    @property
+    def empty(self) -> bool:
+        return self.updated.empty and self.added.empty and not self.deleted
+
+    def summary(self) -> str:
+        return f"{len(self.updated)} alterada(s), {len(self.added)} nova(s), {len(self.deleted)} removida(s)"
+
+
+@dataclass(frozen=True)
+class EditorSnapshot:
+    """Linhas que uma sessão está editando, presas à versão dos dados em que foram lidas.
+
+    `rows` é o mesmo frame do cache compartilhado (sem cópia); enquanto houver edição
+    pendente a sessão continua vendo esta versão, e o save confere conflitos contra ela.
+    """
+    params: tuple
+    version: int
+    rows: pd.DataFrame
+
+
+def has_pending_edits(state: dict | None) -> bool:
+    return bool(state) and any(state.get(k) for k in ("edited_rows", "added_rows", "deleted_rows"))
+
+
+def changes_from_editor(shown: pd.DataFrame, state: dict) -> EditorChanges:
+    """Traduz o estado do `st.data_editor` (posições de linha) em mudanças por ID.
+
+    `shown` é o DataFrame exibido no editor, indexado por ID. Só as linhas tocadas
+    são materializadas, então o custo acompanha o número de edições.
+    """
+    edited = state.get("edited_rows", {}) or {}
+    deleted_pos = state.get("deleted_rows", []) or []
+    added_rows = state.get("added_rows", []) or []
+
+    ids = shown.index
+    deleted = [int(ids[p]) for p in deleted_pos]
+    upd_pos = [int(p) for p in edited if int(p) not in set(deleted_pos)]
+    if upd_pos:
+        updated = shown.iloc[upd_pos][COLS].astype(object)
+        for p, change in edited.items():
+            if int(p) in set(deleted_pos):
+                continue
+            for col, value in change.items():
+                if col in COLS:
+                    updated.at[ids[int(p)], col] = value
+        updated = updated.rename_axis(ID_COL).reset_index()
+    else:
+        updated = pd.DataFrame(columns=[ID_COL] + COLS)
+
+    added = pd.DataFrame([{**NEW_ROW_DEFAULTS, **r} for r in added_rows], columns=COLS)
+    added = added.dropna(subset=["Data"])
+
+    touched = upd_pos + [int(p) for p in deleted_pos]
+    before = shown.iloc[touched].rename_axis(ID_COL).reset_index()
+    return EditorChanges(updated=updated, added=added, deleted=deleted, before=before)
+
+
+def apply_back_to_global(repo, shown: pd.DataFrame, editor_state: dict, version: int) -> EditorChanges:
+    # Grava só as linhas alteradas/novas/removidas, pelo ID; as partições não tocadas ficam como estão.
+    # `version` é a versão em que as linhas foram lidas (controle otimista no repositório).
+    changes = changes_from_editor(shown, editor_state)
+    if not changes.empty:
+        repo.apply_changes(changes.before, changes.updated, changes.added, changes.deleted, expected_version=version)
+    return changes
+
+
+def page_order(rows: pd.DataFrame, search: str = "", sort_by: str = "Data", ascending: bool = True) -> np.ndarray:
+    """Posições (em `rows`) das linhas que casam com a busca, já na ordem pedida.
+
+    A busca olha o nome do cliente (sem diferenciar maiúsculas) e, se for um número,
+    também o ID. O texto é comparado uma vez por categoria, não por linha.
+    """
+    q = search.strip()
+    if q:
+        clientes = rows["Cliente"].astype("category")
+        hit = clientes.cat.categories.astype(str).str.contains(q, case=False, regex=False)
+        mask = np.isin(clientes.cat.codes.to_numpy(), np.flatnonzero(hit))
+        if q.isdigit():
+            mask |= (rows[ID_COL] == int(q)).fillna(False).to_numpy(dtype=bool)
+        pos = np.flatnonzero(mask)
+    else:
+        pos = np.arange(len(rows))
+    keys = rows[sort_by].iloc[pos].reset_index(drop=True)
+    return pos[keys.sort_values(ascending=ascending, kind="stable").index.to_numpy()]
+
+
+def page_slice(rows: pd.DataFrame, order: np.ndarray, page: int, page_size: int) -> pd.DataFrame:
+    # Página 1-based; só estas linhas são materializadas para o editor
+    start = (max(page, 1) - 1) * page_size
+    return rows.iloc[order[start:start + page_size]]
@@ -0,0 +1,134 @@
+import atexit
+import contextlib
+import multiprocessing
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from cache import ContentCache
+from exports import build_share_image, content_key, csv_bytes
+from perf import PerfLog
+
+EXPORT_WORKERS = 2
+
+# Tipos de exportação aceitos pela fila (um PDF entraria aqui)
+RENDERERS = {
+    "png": build_share_image,
+    "csv": csv_bytes,
+}
+
+
+def _warm() -> None:
+    # Roda uma vez em cada processo do pool: carrega as libs pesadas e o cache de fontes
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    from PIL import Image  # noqa: F401
+    build_share_image(pd.DataFrame({"Cliente": ["—"], "Quantidade": [0]}), "")
+
+
+@contextlib.contextmanager
+def _plain_main():
+    # O Streamlit executa o app como __main__; com spawn, cada processo novo
+    # reexecutaria a página inteira. Enquanto os processos sobem, o __main__ é um módulo vazio.
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _render(kind: str, args: tuple) -> tuple[bytes, float]:
+    t0 = time.perf_counter()
+    data = RENDERERS[kind](*args)
+    return data, (time.perf_counter() - t0) * 1000
+
+
+class ExportQueue:
+    """Fila de exportações atendida por um pool de processos pré-aquecido.
+
+    Os trabalhos são identificados pelo hash do conteúdo: pedidos iguais enquanto
+    um já está em andamento reaproveitam o mesmo trabalho, e o resultado vai para
+    o `ContentCache` compartilhado, de onde a página o busca.
+    """
+
+    def __init__(self, cache: ContentCache, workers: int = EXPORT_WORKERS, log: PerfLog | None = None):
+        self.cache = cache
+        self.log = log
+        self.workers = workers
+        self._inflight: dict[str, Future] = {}
+        self._errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pool = self._start()
+        atexit.register(self._shutdown)
+
+    def _start(self) -> ProcessPoolExecutor:
+        # spawn: os processos não herdam threads nem o estado do servidor web
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_warm)
+        # Sobe todos os processos já (cada um roda _warm) em vez de no primeiro clique
+        with _plain_main():
+            for _ in range(self.workers):
+                pool.submit(int)
+        return pool
+
+    def _shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, kind: str, *args) -> str:
+        key = content_key(kind, args[0], *args[1:])
+        with self._lock:
+            if key in self.cache or key in self._inflight:
+                return key
+            self._errors.pop(key, None)
+            try:
+                with _plain_main():
+                    fut = self._pool.submit(_render, kind, args)
+            except BrokenProcessPool:
+                # Um processo do pool morreu (falta de memória, p.ex.): sobe um pool novo e tenta uma vez
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                try:
+                    self._pool = self._start()
+                    with _plain_main():
+                        fut = self._pool.submit(_render, kind, args)
+                except Exception as e:
+                    self._errors[key] = f"fila de exportação indisponível: {e}"
+                    return key
+            self._inflight[key] = fut
+        fut.add_done_callback(lambda f: self._done(key, kind, f))
+        return key
+
+    def _done(self, key: str, kind: str, fut: Future) -> None:
+        try:
+            data, ms = fut.result()
+            self.cache.put(key, data)
+            if self.log is not None:
+                # Tempo de renderização medido dentro do processo do pool
+                self.log.write([{"sessao": "pool", "etapa": f"render_{kind}", "ms": round(ms, 2), "bytes": len(data)}])
+        except Exception as e:
+            self._errors[key] = str(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def status(self, key: str) -> str | None:
+        # "pronto", "processando", "erro" ou None (nunca pedido, ou já despejado do cache)
+        if key in self.cache:
+            return "pronto"
+        if key in self._inflight:
+            return "processando"
+        if key in self._errors:
+            return "erro"
+        return None
+
+    def result(self, key: str) -> bytes | None:
+        return self.cache.get(key)
+
+    def error(self, key: str) -> str | None:
+        return self._errors.get(key)
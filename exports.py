@@ -0,0 +1,57 @@
+import hashlib
+import io
+
+import pandas as pd
+
+
+def content_key(kind: str, df: pd.DataFrame, *parts: str) -> str:
+    # Hash do conteúdo (colunas + valores + parâmetros); igual para qualquer sessão que veja os mesmos dados
+    h = hashlib.sha256(kind.encode("utf-8"))
+    h.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    for p in parts:
+        h.update(b"\x1e" + str(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def build_share_image(bar_df: pd.DataFrame, title: str) -> bytes:
+    # Extra libs for image export (importadas só aqui: o processo web não carrega matplotlib)
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
+    if bar_df.empty:
+        bar_df = pd.DataFrame({"Cliente": ["—"], "Quantidade": [0]})
+
+    # Ordena por quantidade desc
+    bar_df = bar_df.sort_values("Quantidade", ascending=False).reset_index(drop=True)
+
+    # Figura
+    fig = plt.figure(figsize=(10, 8), dpi=200)
+    fig.suptitle(title, fontsize=14, y=0.97)
+
+    # Subplot 1: Tabela
+    ax_table = fig.add_axes([0.06, 0.58, 0.88, 0.34])  # [left, bottom, width, height]
+    ax_table.axis('off')
+    table_data = [["Cliente", "Quantidade"]] + bar_df.values.tolist()
+    table = ax_table.table(cellText=table_data, loc='center')
+    table.auto_set_font_size(False)
+    table.set_fontsize(8)
+    table.scale(1, 1.3)
+
+    # Subplot 2: Gráfico de barras
+    ax_bar = fig.add_axes([0.08, 0.08, 0.84, 0.42])
+    ax_bar.bar(bar_df["Cliente"], bar_df["Quantidade"])
+    ax_bar.set_ylabel("Quantidade")
+    ax_bar.set_xticks(range(len(bar_df)))
+    ax_bar.set_xticklabels(bar_df["Cliente"], rotation=20, ha="right")
+
+    # Render para bytes
+    buf = io.BytesIO()
+    canvas = FigureCanvas(fig)
+    canvas.print_png(buf)
+    plt.close(fig)
+    return buf.getvalue()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO, Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from storage import UpsertResult
+from table import COLS, STATUS
+
+IMPORT_CHUNK_ROWS = 50_000
+REJECT_COLS = ["Linha"] + COLS + ["Motivo"]
+
+# Tudo entra como texto; a conversão é feita por bloco, de forma vetorizada, na validação
+READ_DTYPES = {c: "string" for c in COLS}
+
+
+@dataclass
+class ImportResult:
+    rows_read: int = 0
+    rows_ok: int = 0
+    written: UpsertResult = field(default_factory=UpsertResult)
+    rejects: list[pd.DataFrame] = field(default_factory=list)
+
+    @property
+    def rows_rejected(self) -> int:
+        return sum(len(r) for r in self.rejects)
+
+    def rejects_frame(self) -> pd.DataFrame:
+        if not self.rejects:
+            return pd.DataFrame(columns=REJECT_COLS)
+        return pd.concat(self.rejects, ignore_index=True)[REJECT_COLS]
+
+
+def _fill_missing(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Mesmos padrões do import antigo para colunas ausentes no arquivo
+    defaults = {"Quantidade": "0", "Data": date.today().strftime("%Y-%m-%d"), "Status": "ok"}
+    for c in COLS:
+        if c not in chunk.columns:
+            chunk[c] = pd.Series(defaults.get(c, ""), index=chunk.index, dtype="string")
+    return chunk
+
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    # ISO (2025-07-25) primeiro; o que sobrar tenta o formato da balança (25/07/2025)
+    s = s.str.strip()
+    out = pd.to_datetime(s, format="ISO8601", errors="coerce")
+    retry = out.isna() & s.notna()
+    if retry.any():
+        out[retry] = pd.to_datetime(s[retry], format="%d/%m/%Y", errors="coerce")
+    return out.dt.normalize()
+
+
+def validate_chunk(chunk: pd.DataFrame, units_by_tipo: dict[str, list[str]],
+                   first_line: int = 2) -> tuple[pd.DataFrame, pd.DataFrame]:
+    chunk = _fill_missing(chunk.reset_index(drop=True))
+    raw = chunk[COLS]
+
+    data = _parse_dates(raw["Data"])
+    tipo = raw["Tipo"].fillna("").str.strip()
+    unidade = raw["Unidade"].fillna("").str.strip()
+    cliente = raw["Cliente"].fillna("").str.strip()
+    qtd = pd.to_numeric(raw["Quantidade"].fillna("0").str.strip().str.replace(",", ".", regex=False),
+                        errors="coerce")
+    status = raw["Status"].fillna("").str.strip().str.lower()
+    status = status.where(status.isin(STATUS), "ok")
+
+    valid_pairs = {f"{t}|{u}" for t, units in units_by_tipo.items() for u in units}
+    checks = [
+        (data.isna(), "data inválida"),
+        (~tipo.isin(list(units_by_tipo)), "tipo desconhecido"),
+        (tipo.isin(list(units_by_tipo)) & ~(tipo + "|" + unidade).isin(valid_pairs), "unidade inválida para o tipo"),
+        (qtd.isna(), "quantidade não numérica"),
+        (qtd < 0, "quantidade negativa"),
+        (cliente == "", "cliente vazio"),
+    ]
+    reasons = pd.Series("", index=chunk.index, dtype="string")
+    bad = np.zeros(len(chunk), dtype=bool)
+    for mask, msg in checks:
+        mask = mask.fillna(False).to_numpy(dtype=bool)
+        bad |= mask
+        reasons[mask] = reasons[mask].where(reasons[mask] == "", reasons[mask] + "; ") + msg
+
+    valid = pd.DataFrame({
+        "Data": data, "Tipo": tipo, "Cliente": cliente, "Unidade": unidade,
+        "Quantidade": qtd, "Status": status,
+    })[~bad]
+    rejects = raw[bad].assign(Linha=np.arange(first_line, first_line + len(chunk))[bad], Motivo=reasons[bad])
+    return valid, rejects[REJECT_COLS]
+
+
+def iter_csv_chunks(file: IO, chunksize: int = IMPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(
+        file,
+        dtype=READ_DTYPES,
+        usecols=lambda c: c in COLS,
+        chunksize=chunksize,
+    )
+    with reader:
+        yield from reader
+
+
+def import_csv(file: IO, write: Callable[[pd.DataFrame], UpsertResult], units_by_tipo: dict[str, list[str]],
+               chunksize: int = IMPORT_CHUNK_ROWS, total_bytes: int | None = None,
+               progress: Callable[[float, ImportResult], None] | None = None) -> ImportResult:
+    """Importa um CSV em blocos, gravando as linhas válidas a cada bloco.
+
+    A memória fica limitada a um bloco de `chunksize` linhas mais as rejeitadas.
+    """
+    result = ImportResult()
+    for chunk in iter_csv_chunks(file, chunksize):
+        valid, rejects = validate_chunk(chunk, units_by_tipo, first_line=result.rows_read + 2)
+        result.rows_read += len(chunk)
+        if not valid.empty:
+            result.rows_ok += len(valid)
+            result.written += write(valid)
+        if not rejects.empty:
+            result.rejects.append(rejects)
+        if progress is not None:
+            frac = min(file.tell() / total_bytes, 1.0) if total_bytes else 0.0
+            progress(frac, result)
+    if progress is not None:
+        progress(1.0, result)
+    return result
+
+
+# ----------------------------- Registro de importações -----------------------------
+def file_sha256(file: IO, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    file.seek(0)
+    for buf in iter(lambda: file.read(block), b""):
+        h.update(buf)
+    file.seek(0)
+    return h.hexdigest()
+
+
+class ImportLedger:
+    """Registro persistente (JSON) dos arquivos já importados, pelo SHA-256 do conteúdo."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = json.loads(self.path.read_text("utf-8")) if self.path.exists() else {}
+
+    def get(self, sha: str) -> dict | None:
+        return self._entries.get(sha)
+
+    def record(self, sha: str, arquivo: str, result: ImportResult) -> dict:
+        entry = {
+            "arquivo": arquivo,
+            "importado_em": datetime.now().isoformat(timespec="seconds"),
+            "lidas": result.rows_read,
+            "rejeitadas": result.rows_rejected,
+            "novas": result.written.new,
+            "duplicadas": result.written.duplicate,
+            "atualizadas": result.written.updated,
+            "sinalizadas": result.written.flagged,
+        }
+        with self._lock:
+            self._entries[sha] = entry
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._entries, ensure_ascii=False, indent=1), "utf-8")
+            os.replace(tmp, self.path)
+        return entry
@@ -0,0 +1,129 @@
+"""Medição por etapa de cada rerun (tempo, memória, linhas, bytes) e log em JSON lines.
+
+Agregar o log em percentis por etapa:
+
+    python perf.py dados/_desempenho.jsonl
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+# Acima disso o log é girado para <arquivo>.1 (o anterior é descartado)
+PERF_LOG_MAX_BYTES = 20 * 1024 * 1024
+PERCENTILES = (0.5, 0.9, 0.99)
+
+try:
+    _PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+except (AttributeError, ValueError, OSError):
+    _PAGE_KB = 4
+
+
+def rss_kb() -> int:
+    # Memória residente do processo; /proc é barato o bastante para ler a cada etapa
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def chart_bytes(chart) -> int:
+    # Tamanho da especificação Vega-Lite com os dados embutidos, o que vai para o navegador
+    return len(chart.to_json())
+
+
+def arrow_bytes(df: pd.DataFrame) -> int:
+    # Tabelas (dataframe, data_editor) vão para o navegador como um stream Arrow IPC
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+class RunProfile:
+    """Etapas de um rerun, na ordem em que rodaram."""
+
+    def __init__(self, session: str = ""):
+        self.session = session
+        self.started = time.perf_counter()
+        self.stages: list[dict] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[dict]:
+        # O bloco pode completar o registro: rec["linhas"] = ..., rec["bytes"] = ...
+        rec = {"etapa": name, "linhas": rows, "bytes": None}
+        mem0, t0 = rss_kb(), time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            rec["mem_kb"] = rss_kb() - mem0
+            self.stages.append(rec)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.stages, columns=["etapa", "ms", "mem_kb", "linhas", "bytes"])
+
+
+class PerfLog:
+    """Log local de medições (uma linha JSON por etapa), compartilhado pelas sessões do processo."""
+
+    def __init__(self, path: str | os.PathLike, max_bytes: int = PERF_LOG_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, records: list[dict]) -> None:
+        if not records:
+            return
+        ts = datetime.now().isoformat(timespec="milliseconds")
+        lines = "".join(json.dumps({"ts": ts, **r}, ensure_ascii=False) + "\n" for r in records)
+        with self._lock:
+            if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def record_run(self, profile: RunProfile) -> None:
+        run = f"{profile.session}-{int(profile.started * 1000)}"
+        self.write([{"sessao": profile.session, "rerun": run, **s} for s in profile.stages]
+                   + [{"sessao": profile.session, "rerun": run, "etapa": "total", "ms": profile.total_ms()}])
+
+    def summary(self) -> pd.DataFrame:
+        return summarize(self.path)
+
+
+def summarize(path: str | os.PathLike) -> pd.DataFrame:
+    """Percentis de tempo por etapa, mais memória, linhas e bytes medianos."""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return pd.DataFrame(columns=["etapa", "n"])
+    log = pd.read_json(path, lines=True)
+    g = log.groupby("etapa", sort=False)
+    out = g["ms"].quantile(list(PERCENTILES)).unstack()
+    out.columns = [f"p{int(q * 100)} ms" for q in PERCENTILES]
+    out.insert(0, "n", g.size())
+    out["máx ms"] = g["ms"].max()
+    for col, label in (("mem_kb", "mem kB (p50)"), ("linhas", "linhas (p50)"), ("bytes", "bytes (p50)")):
+        if col in log.columns:
+            out[label] = g[col].median()
+    return out.sort_values("p90 ms", ascending=False).reset_index()
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.environ.get("GV_DATA_DIR", "dados"), "_desempenho.jsonl")
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(summarize(target).to_string(index=False))
@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from table import LedgerTable
+from units import convert
+
+MESES = ["jan","fev","mar","abr","mai","jun","jul","ago","set","out","nov","dez"]
+# Janela do ritmo diário usado na projeção de fim de mês (semanas inteiras: cada dia da semana pesa igual)
+RUN_RATE_DAYS = 56
+PROJECTION_KEYS = ["Cliente", "Tipo"]
+
+
+def month_label(ano: int, mes: int) -> str:
+    return f"{MESES[int(mes)-1].upper()}/{int(ano)}"
+
+
+def ranking_title(periodo_label: str) -> str:
+    return f"G&V • Ranking por Cliente — {periodo_label}"
+
+
+@dataclass(frozen=True)
+class PeriodView:
+    rows: pd.DataFrame        # lançamentos filtrados (df_use), para a tabela e o CSV
+    cumulative: pd.DataFrame  # Data, Quantidade, Tickets, Acumulado (um ponto por dia)
+    ranking: pd.DataFrame     # Cliente, Quantidade (desc)
+    unit: str | None = None   # unidade de cumulative/ranking (None = unidades originais somadas)
+    unconverted: int = 0      # tickets fora dos totais por falta de fator de conversão
+
+    @property
+    def empty(self) -> bool:
+        return self.rows.empty
+
+
+def filter_rollup(rollup: pd.DataFrame, tipo: str | None = None, cliente: str | None = None) -> pd.DataFrame:
+    mask = pd.Series(True, index=rollup.index)
+    if tipo is not None:
+        mask &= rollup["Tipo"] == tipo
+    if cliente is not None:
+        mask &= rollup["Cliente"] == cliente
+    return rollup[mask]
+
+
+def cumulative_series(daily: pd.DataFrame) -> pd.DataFrame:
+    # Lê do cubo diário: o custo depende do número de dias, não de tickets
+    out = daily.groupby("Data", as_index=False, sort=True)[["Quantidade","Tickets"]].sum()
+    out["Acumulado"] = out["Quantidade"].cumsum()
+    return out
+
+
+def downsample_cumulative(cum: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Reduz a série diária a no máximo `max_points` pontos.
+
+    Cada ponto cobre um intervalo [Inicio, Data] de dias consecutivos: Quantidade e
+    Tickets são somados no intervalo e o Acumulado é o do último dia, então o total
+    da série não muda. InicioDia/Dia repetem o intervalo como texto 'AAAA-MM-DD'
+    para a seleção do gráfico.
+    """
+    out = cum.assign(Inicio=cum["Data"])
+    if len(out) > max_points:
+        bucket = np.arange(len(out)) * max_points // len(out)
+        out = out.groupby(bucket, sort=True).agg(
+            Inicio=("Data", "first"), Data=("Data", "last"),
+            Quantidade=("Quantidade", "sum"), Tickets=("Tickets", "sum"), Acumulado=("Acumulado", "last"),
+        ).reset_index(drop=True)
+    return out.assign(InicioDia=out["Inicio"].dt.strftime("%Y-%m-%d"), Dia=out["Data"].dt.strftime("%Y-%m-%d"))
+
+
+def clicked_interval(point: dict) -> tuple[pd.Timestamp, pd.Timestamp]:
+    # Ponto clicado no gráfico acumulado -> [Inicio, Data]. A seleção usa os dias em texto:
+    # datas temporais voltam do navegador no fuso local dele e podem cair no dia anterior
+    return pd.Timestamp(point["InicioDia"]), pd.Timestamp(point["Dia"])
+
+
+def rows_between(rows: pd.DataFrame, start, end) -> pd.DataFrame:
+    # `rows` vem ordenado por Data: busca binária em vez de máscara sobre a coluna
+    dates = rows["Data"].to_numpy()
+    i = dates.searchsorted(np.datetime64(pd.Timestamp(start)), side="left")
+    j = dates.searchsorted(np.datetime64(pd.Timestamp(end)), side="right")
+    return rows.iloc[i:j]
+
+
+def client_ranking(daily: pd.DataFrame) -> pd.DataFrame:
+    if daily.empty:
+        return pd.DataFrame(columns=["Cliente","Quantidade"])
+    out = daily.groupby("Cliente", as_index=False, observed=True)["Quantidade"].sum()
+    out = out.sort_values("Quantidade", ascending=False).reset_index(drop=True)
+    out["Cliente"] = out["Cliente"].astype(str)
+    return out
+
+
+def month_bounds(ano: int, mes: int) -> tuple[date, date]:
+    start = date(int(ano), int(mes), 1)
+    return start, (pd.Timestamp(start) + pd.offsets.MonthEnd(0)).date()
+
+
+def shift_range(start: date, end: date, months: int) -> tuple[date, date]:
+    # Mesmo intervalo deslocado em meses; se o original cobre meses inteiros, o deslocado também
+    s = pd.Timestamp(start) + pd.DateOffset(months=months)
+    e = pd.Timestamp(end) + pd.DateOffset(months=months)
+    if pd.Timestamp(end).is_month_end:
+        e = e + pd.offsets.MonthEnd(0)
+    return s.date(), e.date()
+
+
+def client_comparison(current: pd.DataFrame, previous_month: pd.DataFrame,
+                      previous_year: pd.DataFrame) -> pd.DataFrame:
+    """Totais por cliente no período e nos períodos de comparação (MoM e YoY), a partir do cubo diário."""
+    def totals(cube: pd.DataFrame) -> pd.Series:
+        if cube.empty:
+            return pd.Series(dtype="float64")
+        return cube.groupby(cube["Cliente"].astype(str))["Quantidade"].sum()
+
+    out = pd.DataFrame({
+        "Atual": totals(current),
+        "Mês anterior": totals(previous_month),
+        "Ano anterior": totals(previous_year),
+    }).fillna(0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["Δ MoM %"] = np.where(out["Mês anterior"] > 0, (out["Atual"] / out["Mês anterior"] - 1) * 100, np.nan)
+        out["Δ YoY %"] = np.where(out["Ano anterior"] > 0, (out["Atual"] / out["Ano anterior"] - 1) * 100, np.nan)
+    out = out.rename_axis("Cliente").reset_index().sort_values("Atual", ascending=False, ignore_index=True)
+    return out[["Cliente", "Atual", "Mês anterior", "Δ MoM %", "Ano anterior", "Δ YoY %"]]
+
+
+@dataclass(frozen=True)
+class MonthProjection:
+    by_group: pd.DataFrame  # Cliente, Tipo, Entregue, Ritmo (por dia), Projecao (fim do mês)
+    daily: pd.DataFrame     # Data, Quantidade: volume projetado (todos os grupos) em cada dia que falta
+
+    def by_client(self) -> pd.DataFrame:
+        return self.by_group.groupby("Cliente", as_index=False)[["Entregue", "Projecao"]].sum()
+
+
+def project_month_end(month_cube: pd.DataFrame, history: pd.DataFrame, asof) -> MonthProjection:
+    """Total projetado no fim do mês de `asof` por (Cliente, Tipo), para todos os grupos de uma vez.
+
+    `month_cube` é o cubo diário do mês até `asof` (o entregue) e `history` o dos últimos
+    RUN_RATE_DAYS dias até `asof`. O ritmo é a média por dia da semana de cada grupo na
+    janela; o que falta do mês é o produto da matriz grupos x dia da semana pela contagem
+    de cada dia da semana restante.
+    """
+    asof = pd.Timestamp(asof).normalize()
+    remaining = pd.date_range(asof + pd.Timedelta(days=1), asof + pd.offsets.MonthEnd(0), freq="D")
+    todo = np.bincount(remaining.dayofweek, minlength=7)
+
+    def keyed(cube: pd.DataFrame) -> list[pd.Series]:
+        return [cube[c].astype(str) for c in PROJECTION_KEYS]
+
+    if month_cube.empty and history.empty:
+        return MonthProjection(by_group=pd.DataFrame(columns=PROJECTION_KEYS + ["Entregue", "Ritmo", "Projecao"]),
+                               daily=pd.DataFrame({"Data": remaining, "Quantidade": 0.0}))
+    delivered = month_cube.groupby(keyed(month_cube))["Quantidade"].sum().rename("Entregue")
+    if history.empty:
+        rates = pd.DataFrame(0.0, index=delivered.index, columns=range(7))
+    else:
+        # Dias da semana vistos na janela (um armazenamento novo tem janela mais curta)
+        start = max(asof - pd.Timedelta(days=RUN_RATE_DAYS - 1), pd.Timestamp(history["Data"].min()))
+        seen = np.bincount(pd.date_range(start, asof, freq="D").dayofweek, minlength=7)
+        sums = history.groupby(keyed(history) + [history["Data"].dt.dayofweek.rename("dia")])["Quantidade"].sum()
+        rates = sums.unstack("dia", fill_value=0.0).reindex(columns=range(7), fill_value=0.0) / np.maximum(seen, 1)
+
+    # Grupos sem entrega no mês ou sem histórico entram com zero na parte que falta
+    groups = rates.join(delivered, how="outer").fillna(0.0)
+    matrix = groups[list(range(7))].to_numpy(dtype="float64")
+    out = pd.DataFrame({
+        "Entregue": groups["Entregue"].to_numpy(),
+        "Ritmo": matrix.mean(axis=1),
+        "Projecao": groups["Entregue"].to_numpy() + matrix @ todo,
+    }, index=groups.index).rename_axis(PROJECTION_KEYS).reset_index()
+    daily = pd.DataFrame({"Data": remaining, "Quantidade": matrix.sum(axis=0)[remaining.dayofweek]})
+    return MonthProjection(by_group=out.sort_values("Projecao", ascending=False, ignore_index=True), daily=daily)
+
+
+def projection_path(cumulative: pd.DataFrame, projection: MonthProjection, asof) -> pd.DataFrame:
+    # Continuação tracejada do acumulado: parte do acumulado em `asof` e soma o projetado dia a dia
+    asof = pd.Timestamp(asof).normalize()
+    done = cumulative[cumulative["Data"] <= asof]
+    base = float(done["Acumulado"].iloc[-1]) if not done.empty else 0.0
+    daily = projection.daily
+    return pd.DataFrame({
+        "Data": np.concatenate([[asof.to_datetime64()], daily["Data"].to_numpy()]),
+        "Acumulado": base + np.concatenate([[0.0], daily["Quantidade"].cumsum().to_numpy()]),
+    })
+
+
+def ranking_with_projection(ranking: pd.DataFrame, projection: MonthProjection) -> pd.DataFrame:
+    # Total do período mais o que falta entregar até o fim do mês, por cliente
+    rest = projection.by_client().set_index("Cliente")
+    rest = rest["Projecao"] - rest["Entregue"]
+    return ranking.assign(**{"Projeção": ranking["Quantidade"] + ranking["Cliente"].map(rest).fillna(0.0).to_numpy()})
+
+
+def build_period_view(table: LedgerTable, rollup: pd.DataFrame, start: date, end: date,
+                      tipo: str | None = None, cliente: str | None = None,
+                      factors: pd.DataFrame | None = None, unit: str | None = None) -> PeriodView:
+    rows = table.filter_range(start, end, tipo=tipo, cliente=cliente)
+    # A conversão de unidades é feita no cubo (dias x dimensões), antes de somar
+    daily, unconverted = convert(filter_rollup(rollup, tipo=tipo, cliente=cliente), factors, unit)
+    return PeriodView(rows=rows, cumulative=cumulative_series(daily), ranking=client_ranking(daily),
+                      unit=unit, unconverted=unconverted)
@@ -0,0 +1,112 @@
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from table import KNOWN_CATEGORIES, as_category
+
+ROLLUP_DIMS = ["Data","Tipo","Cliente","Unidade"]
+# Quadrados = soma de Quantidade² (média e desvio por cliente sem reler os tickets)
+ROLLUP_COLS = ROLLUP_DIMS + ["Quantidade","Tickets","Quadrados"]
+
+
+def aggregate(rows: pd.DataFrame, sign: int = 1) -> pd.DataFrame:
+    # Totais diários por (Data, Tipo, Cliente, Unidade); sign=-1 gera o delta de remoção
+    if rows.empty:
+        return empty_rollup()
+    out = rows.assign(Quadrados=rows["Quantidade"] ** 2).groupby(ROLLUP_DIMS, observed=True, sort=False).agg(
+        Quantidade=("Quantidade", "sum"), Tickets=("Quantidade", "size"), Quadrados=("Quadrados", "sum"),
+    ).reset_index()
+    out["Quantidade"] *= sign
+    out["Quadrados"] *= sign
+    out["Tickets"] = out["Tickets"].astype("int64") * sign
+    return _typed(out)
+
+
+def combine(*parts: pd.DataFrame) -> pd.DataFrame:
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return empty_rollup()
+    if len(parts) == 1:
+        return parts[0]
+    merged = pd.concat([p.astype({c: str for c in ROLLUP_DIMS[1:]}) for p in parts], ignore_index=True)
+    out = merged.groupby(ROLLUP_DIMS, sort=False).agg(
+        Quantidade=("Quantidade", "sum"), Tickets=("Tickets", "sum"), Quadrados=("Quadrados", "sum"),
+    ).reset_index()
+    # Grupos que ficaram sem tickets (tudo removido) saem do cubo
+    out = out[out["Tickets"] > 0]
+    return _typed(out)
+
+
+def empty_rollup() -> pd.DataFrame:
+    return _typed(pd.DataFrame({
+        "Data": pd.Series(dtype="datetime64[us]"), "Tipo": [], "Cliente": [], "Unidade": [],
+        "Quantidade": pd.Series(dtype="float64"), "Tickets": pd.Series(dtype="int64"),
+        "Quadrados": pd.Series(dtype="float64"),
+    }))
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[ROLLUP_COLS].copy()
+    for c in ("Tipo", "Unidade"):
+        df[c] = as_category(df[c], KNOWN_CATEGORIES[c])
+    df["Cliente"] = as_category(df["Cliente"])
+    df["Data"] = pd.to_datetime(df["Data"])
+    return df.sort_values(ROLLUP_DIMS[:1], kind="stable").reset_index(drop=True)
+
+
+class RollupStore:
+    """Cubo diário materializado, um arquivo por mês em <root>/_rollup/.
+
+    É mantido por deltas (+linhas novas, -linhas removidas) a cada gravação do
+    repositório; quando o arquivo de um mês não existe, é montado uma vez a
+    partir da partição.
+    """
+
+    def __init__(self, root: str | os.PathLike, load_partition: Callable[[int, int], pd.DataFrame]):
+        self.root = Path(root) / "_rollup"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_partition = load_partition
+        self._cache: dict[tuple[int, int], pd.DataFrame] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, ano: int, mes: int) -> Path:
+        return self.root / f"ano={int(ano)}-mes={int(mes):02d}.parquet"
+
+    def get(self, ano: int, mes: int) -> pd.DataFrame:
+        key = (int(ano), int(mes))
+        with self._lock:
+            if key not in self._cache:
+                path = self._path(*key)
+                # Arquivos de versões anteriores (sem todas as colunas) são remontados
+                if path.exists() and set(ROLLUP_COLS) <= set(pq.read_schema(path).names):
+                    self._cache[key] = _typed(pd.read_parquet(path))
+                else:
+                    self._cache[key] = aggregate(self._load_partition(*key))
+                    self._save(key)
+            return self._cache[key]
+
+    def apply(self, ano: int, mes: int, *deltas: pd.DataFrame) -> None:
+        deltas = tuple(d for d in deltas if not d.empty)
+        if not deltas:
+            return
+        with self._lock:
+            key = (int(ano), int(mes))
+            self._cache[key] = combine(self.get(*key), *deltas)
+            self._save(key)
+
+    def clear(self) -> None:
+        # Descarta todos os cubos; cada mês é remontado da partição no próximo acesso
+        with self._lock:
+            self._cache.clear()
+            for f in self.root.glob("*.parquet"):
+                f.unlink(missing_ok=True)
+
+    def _save(self, key: tuple[int, int]) -> None:
+        path = self._path(*key)
+        tmp = path.with_name(f".{path.name}.tmp")
+        self._cache[key].to_parquet(tmp, index=False)
+        os.replace(tmp, path)
@@ -0,0 +1,566 @@
+import bisect
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from anomalies import HISTORY_DAYS, REVIEWED, check, history_table
+from clients import ClientRegistry
+from rollup import RollupStore, aggregate, empty_rollup
+from table import ALERT_COL, COLS, ID_COL, STATUS, as_category, normalize
+
+# Os frames lidos ficam em caches compartilhados por todas as sessões; com copy-on-write
+# (padrão a partir do pandas 3) quem deriva e altera um deles recebe a própria cópia
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Acima disso, o próximo append funde os arquivos da partição em um só
+MAX_PARTS_PER_PARTITION = 32
+STORE_COLS = [ID_COL] + COLS + [ALERT_COL]
+# No arquivo o cliente é gravado como ID inteiro do cadastro (ClientRegistry), não como texto
+CLIENT_ID_COL = "ClienteID"
+FILE_COLS = [CLIENT_ID_COL if c == "Cliente" else c for c in STORE_COLS]
+STORE_FORMAT = 2
+META_FILE = "_meta.json"
+# Lista das partes vigentes de cada partição, trocada atomicamente a cada gravação
+PARTS_FILE = "_partes.json"
+# Leituras que cruzam uma reescrita relêem a lista; na última tentativa a leitura é feita sob o lock
+READ_RETRIES = 3
+CLIENTS_FILE = "_clientes.json"
+
+
+def _period_key(d: pd.Series) -> pd.Series:
+    return d.dt.year * 100 + d.dt.month
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    # Hash uint64 da chave natural (Data, Tipo, Cliente, Unidade, Quantidade).
+    # Independe da resolução da data e de categoria vs texto; o Status fica de fora
+    # porque é o campo que o upsert atualiza.
+    keys = pd.DataFrame({
+        "Data": df["Data"].to_numpy().astype("datetime64[D]").astype("int64"),
+        "Tipo": df["Tipo"].astype(str).to_numpy(),
+        "Cliente": df["Cliente"].astype(str).to_numpy(),
+        "Unidade": df["Unidade"].astype(str).to_numpy(),
+        "Quantidade": df["Quantidade"].round(3).to_numpy(),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def _status_codes(status) -> np.ndarray:
+    return pd.Categorical(np.asarray(status, dtype=object), categories=STATUS).codes.astype("int8")
+
+
+class KeyIndex:
+    """Chaves naturais de uma partição (hash uint64, ordenadas) e o código de Status de cada uma.
+
+    Cerca de 9 bytes por linha; a consulta é uma busca binária vetorizada. Chaves
+    repetidas na partição valem pela última gravada, como num dicionário.
+    """
+
+    def __init__(self, keys: np.ndarray, status) -> None:
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.codes = _status_codes(status)[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _positions(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Posição da última ocorrência de cada chave e se ela existe
+        pos = np.searchsorted(self.keys, keys, side="right") - 1
+        found = pos >= 0
+        found[found] = self.keys[pos[found]] == keys[found]
+        return pos, found
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Código de Status (posição em STATUS) de cada chave; -1 se não existe."""
+        pos, found = self._positions(keys)
+        out = np.full(len(keys), -1, dtype="int8")
+        out[found] = self.codes[pos[found]]
+        return out
+
+    def add(self, keys: np.ndarray, status) -> None:
+        keys = np.concatenate([self.keys, keys])
+        codes = np.concatenate([self.codes, _status_codes(status)])
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.codes = keys[order], codes[order]
+
+    def set_status(self, keys: np.ndarray, status) -> None:
+        pos, found = self._positions(keys)
+        self.codes[pos[found]] = _status_codes(status)[found]
+
+
+class ConflictError(Exception):
+    """Linhas editadas que outra sessão alterou ou removeu depois da leitura."""
+
+    def __init__(self, conflicts: pd.DataFrame):
+        self.conflicts = conflicts  # ID + COLS (valores atuais) + Motivo
+        super().__init__(f"{len(conflicts)} linha(s) alterada(s) por outra sessão")
+
+
+@dataclass
+class UpsertResult:
+    new: int = 0
+    duplicate: int = 0
+    updated: int = 0
+    flagged: int = 0  # gravadas como "verificando" pelas regras automáticas
+
+    def __iadd__(self, other: "UpsertResult") -> "UpsertResult":
+        self.new += other.new
+        self.duplicate += other.duplicate
+        self.updated += other.updated
+        self.flagged += other.flagged
+        return self
+
+
+def _conflicting_rows(before: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    # Linhas de `before` que não estão mais iguais na partição atual (chave natural + Status)
+    now = current[current[ID_COL].isin(before[ID_COL])].set_index(ID_COL)
+    was = normalize(before).set_index(ID_COL)
+    gone = ~was.index.isin(now.index)
+    kept = was.index[~gone]
+    same = (row_keys(was.loc[kept]) == row_keys(now.loc[kept])) & (
+        was.loc[kept, "Status"].astype(str).to_numpy() == now.loc[kept, "Status"].astype(str).to_numpy())
+    changed = now.loc[kept[~same], COLS].assign(Motivo="alterada por outra sessão")
+    removed = was.loc[gone, COLS].assign(Motivo="removida por outra sessão")
+    return pd.concat([changed, removed]).rename_axis(ID_COL).reset_index()
+
+
+class LedgerRepository:
+    """Armazena os lançamentos em Parquet particionado por ano/mês.
+
+    Layout: <root>/ano=2025/mes=07/part-*.parquet. Cada leitura abre apenas a
+    partição do período pedido; appends gravam um arquivo novo na partição e
+    substituições reescrevem só as partições tocadas.
+
+    Quais partes valem é dito pelo _partes.json da partição, publicado com
+    `os.replace` depois que a parte nova está gravada; as antigas só são removidas
+    depois disso. Um leitor vê a partição antes ou depois da gravação, nunca as
+    duas (linhas em dobro) nem uma parte já removida sem tentar de novo.
+    """
+
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.clients = ClientRegistry(self.root / CLIENTS_FILE)
+        # Índice por partição: hash da chave natural -> Status (montado sob demanda)
+        self._keys: dict[tuple[int, int], KeyIndex] = {}
+        # Histórico acumulado por cliente usado pelas regras, por mês de referência (refeito a cada gravação)
+        self._stats: dict[tuple[int, int], pd.DataFrame] = {}
+        # Incrementada a cada gravação; usada como chave dos caches de consulta
+        self.version = 0
+        self._next_id = self._load_next_id()
+        self._rollups = RollupStore(self.root, self.load)
+
+    # ----------------------------- IDs -----------------------------
+    def _load_next_id(self) -> int:
+        meta = self.root / META_FILE
+        data = json.loads(meta.read_text("utf-8")) if meta.exists() else {}
+        if data.get("formato", 1) >= STORE_FORMAT:
+            return int(data["next_id"])
+        if "next_id" in data:
+            self._next_id = int(data["next_id"])
+        else:
+            # Primeira execução (ou base antiga sem IDs): numera o que já existe e registra o contador
+            self._next_id = 1
+            for f in sorted(self.root.glob("ano=*/mes=*/*.parquet")):
+                if ID_COL in pq.read_schema(f).names:
+                    ids = pd.read_parquet(f, columns=[ID_COL])[ID_COL]
+                    if len(ids) and pd.notna(ids.max()):
+                        self._next_id = max(self._next_id, int(ids.max()) + 1)
+        # Arquivos de formatos antigos (sem ID, ou com o cliente em texto) são regravados no atual
+        for f in sorted(self.root.glob("ano=*/mes=*/*.parquet")):
+            names = pq.read_schema(f).names
+            if ID_COL not in names or CLIENT_ID_COL not in names:
+                df = self._assign_ids(self._read_file(f))
+                tmp = f.with_name(f".{f.name}.tmp")
+                self._to_file(df).to_parquet(tmp, index=False)
+                os.replace(tmp, f)
+        self._save_next_id()
+        return self._next_id
+
+    def _save_next_id(self) -> None:
+        meta = self.root / META_FILE
+        tmp = meta.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"next_id": self._next_id, "formato": STORE_FORMAT}), "utf-8")
+        os.replace(tmp, meta)
+
+    def _assign_ids(self, rows: pd.DataFrame) -> pd.DataFrame:
+        if ID_COL not in rows.columns:
+            rows = rows.assign(**{ID_COL: pd.array([pd.NA] * len(rows), dtype="Int64")})[STORE_COLS]
+        missing = rows[ID_COL].isna().to_numpy()
+        n = int(missing.sum())
+        if n:
+            with self._lock:
+                start = self._next_id
+                self._next_id += n
+                self._save_next_id()
+            ids = rows[ID_COL].copy()
+            ids[missing] = np.arange(start, start + n)
+            rows = rows.assign(**{ID_COL: ids})
+        return rows
+
+    # ----------------------------- Caminhos -----------------------------
+    def _partition_dir(self, ano: int, mes: int) -> Path:
+        return self.root / f"ano={int(ano)}" / f"mes={int(mes):02d}"
+
+    def _files(self, ano: int, mes: int) -> list[Path]:
+        folder = self._partition_dir(ano, mes)
+        try:
+            names = json.loads((folder / PARTS_FILE).read_text("utf-8"))
+        except FileNotFoundError:
+            # Partição gravada antes da lista de partes: vale o que está na pasta
+            return sorted(folder.glob("*.parquet"))
+        return [folder / n for n in names]
+
+    def _publish(self, folder: Path, files: list[Path]) -> None:
+        tmp = folder / f".{PARTS_FILE}.tmp"
+        tmp.write_text(json.dumps(sorted(f.name for f in files)), "utf-8")
+        os.replace(tmp, folder / PARTS_FILE)
+
+    def periods(self) -> list[tuple[int, int]]:
+        out = set()
+        for p in self.root.glob("ano=*/mes=*/*.parquet"):
+            ano = int(p.parent.parent.name.split("=", 1)[1])
+            mes = int(p.parent.name.split("=", 1)[1])
+            out.add((ano, mes))
+        return sorted(out)
+
+    def is_empty(self) -> bool:
+        return not self.periods()
+
+    # ----------------------------- Leitura -----------------------------
+    def load(self, ano: int, mes: int) -> pd.DataFrame:
+        return self.query(ano, mes)
+
+    def query(self, ano: int, mes: int, tipo: str | None = None, cliente: str | None = None) -> pd.DataFrame:
+        for _ in range(READ_RETRIES - 1):
+            try:
+                return self._query(ano, mes, tipo, cliente)
+            except FileNotFoundError:
+                # Uma reescrita removeu uma parte depois que a lista foi lida: a lista nova já está publicada
+                continue
+        with self._lock:
+            return self._query(ano, mes, tipo, cliente)
+
+    def _query(self, ano: int, mes: int, tipo: str | None, cliente: str | None) -> pd.DataFrame:
+        files = self._files(ano, mes)
+        if not files:
+            return self._empty()
+        filters = []
+        if tipo is not None:
+            filters.append(("Tipo", "==", tipo))
+        if cliente is not None:
+            # O filtro vai como inteiros: o cliente e as grafias unificadas nele
+            ids = self.clients.ids_of(cliente)
+            if not ids:
+                return self._empty()
+            filters.append((CLIENT_ID_COL, "in", ids))
+        frames = [self._read_file(f, filters or None) for f in files]
+        return frames[0] if len(frames) == 1 else normalize(pd.concat(frames, ignore_index=True))
+
+    def _read_file(self, path: Path, filters: list | None = None) -> pd.DataFrame:
+        df = pd.read_parquet(path, filters=filters)
+        if CLIENT_ID_COL in df.columns:
+            df["Cliente"] = self.clients.decode(df.pop(CLIENT_ID_COL))
+        return normalize(df)
+
+    def _to_file(self, df: pd.DataFrame) -> pd.DataFrame:
+        out = df[STORE_COLS].reset_index(drop=True)
+        out = out.assign(Cliente=self.clients.intern(out["Cliente"])).rename(columns={"Cliente": CLIENT_ID_COL})
+        return out[FILE_COLS]
+
+    def periods_between(self, start, end) -> list[tuple[int, int]]:
+        # Partições existentes que cruzam [start, end]; busca binária na lista ordenada de períodos
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        periods = self.periods()
+        i = bisect.bisect_left(periods, (start.year, start.month))
+        j = bisect.bisect_right(periods, (end.year, end.month))
+        return periods[i:j]
+
+    def load_range(self, start, end) -> pd.DataFrame:
+        # Lê só as partições do intervalo; o corte fino por dia fica com LedgerTable.between
+        frames = [self.load(ano, mes) for ano, mes in self.periods_between(start, end)]
+        if not frames:
+            return self._empty()
+        return frames[0] if len(frames) == 1 else normalize(pd.concat(frames, ignore_index=True))
+
+    def rollup(self, ano: int, mes: int) -> pd.DataFrame:
+        # Totais diários por (Data, Tipo, Cliente, Unidade) do mês, sem ler os lançamentos
+        return self._rollups.get(ano, mes)
+
+    def rollup_range(self, start, end) -> pd.DataFrame:
+        parts = [self._rollups.get(ano, mes) for ano, mes in self.periods_between(start, end)]
+        if not parts:
+            return empty_rollup()
+        cube = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+        # Cada mês vem ordenado por Data e os meses estão em ordem: o corte é por busca binária
+        dates = cube["Data"].to_numpy()
+        i = dates.searchsorted(np.datetime64(pd.Timestamp(start).normalize()), side="left")
+        j = dates.searchsorted(np.datetime64(pd.Timestamp(end).normalize()), side="right")
+        return cube.iloc[i:j]
+
+    def clientes(self) -> list[str]:
+        # Lista do cadastro, já ordenada; não lê os arquivos
+        return self.clients.names()
+
+    def merge_client(self, variante: str, destino: str) -> None:
+        # Unifica uma grafia em outro cliente. Os arquivos ficam como estão (a leitura já
+        # resolve para o destino); cubos e índices de chave, montados com o nome antigo, são refeitos.
+        with self._lock:
+            self.clients.merge(variante, destino)
+            self._rollups.clear()
+            self._keys.clear()
+            self._touch()
+
+    # ----------------------------- Escrita -----------------------------
+    def append(self, rows: pd.DataFrame) -> int:
+        rows = self._coerce(rows)
+        if rows.empty:
+            return 0
+        with self._lock:
+            rows = self._flag(rows)
+            for key, part in rows.groupby(_period_key(rows["Data"]), sort=True):
+                ano, mes = divmod(int(key), 100)
+                self._append_partition(ano, mes, part)
+            self._touch()
+        return len(rows)
+
+    def upsert(self, rows: pd.DataFrame) -> UpsertResult:
+        """Grava só o que é novo pela chave natural; chaves já existentes com outro Status são atualizadas.
+
+        O custo é proporcional às linhas recebidas: a consulta é feita no índice de
+        chaves da partição, sem concatenar nem comparar com o histórico inteiro.
+        As regras automáticas rodam só nas linhas novas; linhas já gravadas que um
+        operador revisou (Alerta "revisado") ou que uma regra marcou não são
+        alteradas pela importação.
+        """
+        rows = self._coerce(rows)
+        result = UpsertResult()
+        if rows.empty:
+            return result
+        with self._lock:
+            for key, part in rows.groupby(_period_key(rows["Data"]), sort=True):
+                ano, mes = divmod(int(key), 100)
+                keys = row_keys(part)
+                # Repetidas dentro do próprio lote: vale a última ocorrência
+                repeated = pd.Index(keys).duplicated(keep="last")
+                result.duplicate += int(repeated.sum())
+                part, keys = part[~repeated], keys[~repeated]
+
+                status = part["Status"].astype(str).to_numpy()
+                current = self._key_index(ano, mes).lookup(keys)
+                is_new = current < 0
+                changed = ~is_new & (current != _status_codes(status))
+                updated = 0
+                if changed.any():
+                    alert = part[ALERT_COL].astype(str).to_numpy(dtype=object)
+                    updated = self._update_status(ano, mes, keys[changed], status[changed], alert[changed])
+                result.updated += updated
+                result.duplicate += int((~is_new).sum()) - updated
+
+                if is_new.any():
+                    # Regras só nas linhas novas; duplicatas já são tratadas pela própria chave
+                    new = self._check(ano, mes, part[is_new], np.empty(0, dtype="uint64"))
+                    result.new += len(new)
+                    result.flagged += int((new[ALERT_COL].astype(str) != "").sum())
+                    self._append_partition(ano, mes, new)
+            if result.new or result.updated:
+                self._touch()
+        return result
+
+    def apply_changes(self, before: pd.DataFrame, updated: pd.DataFrame,
+                      added: pd.DataFrame, deleted: list[int], expected_version: int | None = None) -> None:
+        """Aplica só as linhas alteradas de uma edição.
+
+        `before` traz as versões originais (ID + COLS) das linhas atualizadas/removidas,
+        como a sessão as leu, e indica a partição de origem de cada uma; somente essas
+        partições são reescritas. Controle otimista: se a versão lida não é mais a atual,
+        cada linha tocada é comparada com o armazenamento e, se outra sessão já a mudou,
+        nada é gravado e `ConflictError` lista as linhas em conflito.
+        """
+        updated = self._coerce(updated) if not updated.empty else self._empty()
+        touched = set(updated[ID_COL].dropna().astype(int)) | {int(i) for i in deleted}
+        with self._lock:
+            updated = self._flag(self._review(before, updated), exclude_ids=touched)
+            origin = before[before[ID_COL].isin(list(touched))]
+            groups = {int(key): grp for key, grp in origin.groupby(_period_key(pd.to_datetime(origin["Data"])), sort=True)}
+            currents = {key: self.load(*divmod(key, 100)) for key in groups}
+            if expected_version != self.version:
+                conflicts = [_conflicting_rows(grp, currents[key]) for key, grp in groups.items()]
+                conflicts = [c for c in conflicts if not c.empty]
+                if conflicts:
+                    raise ConflictError(pd.concat(conflicts, ignore_index=True))
+
+            target = _period_key(updated["Data"])
+            for key, grp in groups.items():
+                ano, mes = divmod(key, 100)
+                self._rollups.get(ano, mes)  # materializa o cubo antes de mexer na partição
+                current = currents[key]
+                hit = current[ID_COL].isin(grp[ID_COL])
+                staying = updated[target == key]
+                self._write(ano, mes, pd.concat([current[~hit], staying], ignore_index=True))
+                self._rollups.apply(ano, mes, aggregate(current[hit], sign=-1), aggregate(staying))
+            # Linhas cuja Data mudou de mês vão para a partição nova
+            moved = updated[~target.isin(list(groups))]
+            if not added.empty:
+                moved = pd.concat([moved, self._flag(self._coerce(added))], ignore_index=True)
+            for key, part in moved.groupby(_period_key(moved["Data"]), sort=True):
+                ano, mes = divmod(int(key), 100)
+                self._append_partition(ano, mes, part)
+            self._touch()
+
+    def recheck(self, start=None, end=None) -> int:
+        """Roda as regras automáticas sobre o histórico (ou o intervalo) de uma vez.
+
+        Regrava só as partições em que alguma linha passou a "verificando" ou mudou
+        de motivo; devolve quantas linhas foram sinalizadas.
+        """
+        periods = self.periods() if start is None else self.periods_between(start, end)
+        flagged = 0
+        with self._lock:
+            for ano, mes in periods:
+                current = self.load(ano, mes)
+                checked = self._check(ano, mes, current, np.empty(0, dtype="uint64"))
+                diff = ((checked["Status"].astype(str) != current["Status"].astype(str))
+                        | (checked[ALERT_COL].astype(str) != current[ALERT_COL].astype(str)))
+                if diff.any():
+                    flagged += int(diff.sum())
+                    self._write(ano, mes, checked)
+            if flagged:
+                self._touch()
+        return flagged
+
+    def _touch(self) -> None:
+        self._stats.clear()
+        self.version += 1
+
+    # ----------------------------- Regras automáticas -----------------------------
+    def _client_history(self, ano: int, mes: int) -> pd.DataFrame:
+        # Cubo diário dos HISTORY_DAYS dias antes do mês até o fim dele; cada linha só enxerga
+        # os dias anteriores à sua Data (anomalies.row_history)
+        key = (int(ano), int(mes))
+        if key not in self._stats:
+            start = pd.Timestamp(key[0], key[1], 1)
+            cube = self.rollup_range(start - pd.Timedelta(days=HISTORY_DAYS), start + pd.offsets.MonthEnd(0))
+            self._stats[key] = history_table(cube)
+        return self._stats[key]
+
+    def _check(self, ano: int, mes: int, part: pd.DataFrame, existing_keys: np.ndarray) -> pd.DataFrame:
+        return check(part, self._client_history(ano, mes), row_keys(part), existing_keys)
+
+    def _flag(self, rows: pd.DataFrame, exclude_ids: set[int] = frozenset()) -> pd.DataFrame:
+        # Regras mês a mês; a duplicidade é conferida contra o que já está gravado no mês,
+        # sem as linhas `exclude_ids` (as próprias linhas de uma edição)
+        if rows.empty:
+            return rows
+        rows = rows.reset_index(drop=True)
+        parts = []
+        for key, part in rows.groupby(_period_key(rows["Data"]), sort=False):
+            ano, mes = divmod(int(key), 100)
+            if exclude_ids:
+                current = self.load(ano, mes)
+                known = row_keys(current[~current[ID_COL].isin(list(exclude_ids))])
+            else:
+                known = self._key_index(ano, mes).keys
+            parts.append(self._check(ano, mes, part, known))
+        return normalize(pd.concat(parts).sort_index())
+
+    @staticmethod
+    def _review(before: pd.DataFrame, updated: pd.DataFrame) -> pd.DataFrame:
+        # Linha "verificando" que o operador passou para "ok" fica como revisada (as regras não
+        # a marcam de novo); nas demais linhas editadas, o motivo antigo é recalculado
+        if updated.empty:
+            return updated
+        was = before.set_index(ID_COL)
+        ids = updated[ID_COL].astype("int64")
+        old_status = ids.map(was["Status"].astype(str)).astype(str).to_numpy()
+        old_alert = (ids.map(was[ALERT_COL].astype(str)).astype(str).to_numpy()
+                     if ALERT_COL in was.columns else np.full(len(ids), ""))
+        released = (old_status == "verificando") & (updated["Status"].astype(str).to_numpy() == "ok")
+        keep = released | (old_alert == REVIEWED)
+        return updated.assign(**{ALERT_COL: as_category(pd.Series(np.where(keep, REVIEWED, ""), index=updated.index))})
+
+    def _key_index(self, ano: int, mes: int) -> KeyIndex:
+        index = self._keys.get((ano, mes))
+        if index is None:
+            df = self.load(ano, mes)
+            index = self._keys[(ano, mes)] = KeyIndex(row_keys(df), df["Status"].astype(str).to_numpy())
+        return index
+
+    def _append_partition(self, ano: int, mes: int, part: pd.DataFrame) -> None:
+        index = self._keys.get((ano, mes))
+        self._rollups.get(ano, mes)
+        if len(self._files(ano, mes)) >= MAX_PARTS_PER_PARTITION:
+            self._write(ano, mes, pd.concat([self.load(ano, mes), part], ignore_index=True))
+        else:
+            self._write_part(ano, mes, part)
+        self._rollups.apply(ano, mes, aggregate(part))
+        if index is not None:
+            index.add(row_keys(part), part["Status"].astype(str).to_numpy())
+            self._keys[(ano, mes)] = index
+
+    def _update_status(self, ano: int, mes: int, keys: np.ndarray,
+                       new_status: np.ndarray, new_alert: np.ndarray) -> int:
+        # Troca Status e Alerta das linhas gravadas com essas chaves. Ficam como estão as revisadas
+        # por um operador e as que uma regra marcou (só a revisão libera essas, não um "ok" importado).
+        # `keys` sem repetição (o upsert já descartou as repetidas do lote); devolve quantas
+        # chaves foram de fato atualizadas.
+        df = self.load(ano, mes)
+        status = df["Status"].astype(str).to_numpy(dtype=object)
+        alert = df[ALERT_COL].astype(str).to_numpy(dtype=object)
+        pos = pd.Index(keys).get_indexer(row_keys(df))
+        incoming = np.where(pos >= 0, new_status[np.maximum(pos, 0)], "")
+        hit = (pos >= 0) & (alert != REVIEWED) & ~((alert != "") & (incoming == "ok"))
+        if not hit.any():
+            return 0
+        status[hit] = new_status[pos[hit]]
+        alert[hit] = new_alert[pos[hit]]
+        applied = keys[np.unique(pos[hit])]
+        index = self._keys.get((ano, mes))
+        self._write(ano, mes, df.assign(Status=status, **{ALERT_COL: alert}))
+        if index is not None:
+            index.set_status(applied, new_status[np.unique(pos[hit])])
+            self._keys[(ano, mes)] = index
+        return len(applied)
+
+    def _write_part(self, ano: int, mes: int, df: pd.DataFrame, replace: bool = False) -> None:
+        # Grava a parte nova, publica a lista de partes e só então remove as que saíram dela
+        folder = self._partition_dir(ano, mes)
+        folder.mkdir(parents=True, exist_ok=True)
+        old = self._files(ano, mes)
+        name = f"part-{uuid.uuid4().hex}.parquet"
+        # Arquivos começando com "." não casam com o glob de leitura até o rename
+        tmp = folder / f".{name}.tmp"
+        self._to_file(df).to_parquet(tmp, index=False)
+        path = folder / name
+        os.replace(tmp, path)
+        self._publish(folder, [path] if replace else old + [path])
+        if replace:
+            for f in old:
+                f.unlink(missing_ok=True)
+
+    def _write(self, ano: int, mes: int, df: pd.DataFrame) -> None:
+        # Reescreve a partição inteira em uma parte só
+        self._write_part(ano, mes, df, replace=True)
+        self._keys.pop((ano, mes), None)
+
+    # ----------------------------- Tipos -----------------------------
+    @staticmethod
+    def _empty() -> pd.DataFrame:
+        return normalize(pd.DataFrame(columns=STORE_COLS))
+
+    def _coerce(self, rows: pd.DataFrame) -> pd.DataFrame:
+        # Linhas que chegam sem ID (import, formulário, linhas novas do editor) recebem um;
+        # o nome do cliente é trocado pelo do cadastro (grafias e apelidos conhecidos)
+        rows = normalize(rows.dropna(subset=["Data"]))
+        rows["Cliente"] = as_category(self.clients.canonical(rows["Cliente"]))
+        return self._assign_ids(rows)
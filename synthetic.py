@@ -0,0 +1,111 @@
+"""Gera um livro de lançamentos sintético (10 mil a 10 milhões de linhas) para testes de carga.
+
+Exemplo:
+
+    python synthetic.py --linhas 1000000 --meses 24 --dados dados_sint
+
+A distribuição imita a operação: poucos clientes concentram o volume (Zipf), cada
+cliente tem um produto principal e uma escala de carga própria, as unidades seguem
+UNITS_BY_TIPO, há menos tickets no fim de semana e uma parte dos nomes chega com
+grafias variadas (caixa, acentos, espaços). Mesma semente, mesmo livro.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from storage import LedgerRepository
+from table import COLS, TIPOS, UNITS_BY_TIPO
+
+SYNTH_CHUNK_ROWS = 1_000_000
+TIPO_WEIGHTS = [0.5, 0.35, 0.15]  # Toras, Cavaco, Lenha
+# Carga típica por unidade (uma carreta), antes da escala do cliente
+UNIT_SCALE = {"ST": 45.0, "TN": 30.0, "m3": 80.0}
+WEEKDAY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 0.15])
+_SYLLABLES = ["ma", "ca", "lo", "ri", "ta", "be", "gu", "no", "sa", "pe", "ver", "cam", "pra", "dor", "lân", "tê"]
+_SUFFIXES = ["", " Ltda", " S.A.", " Agro", " Alimentos", " Madeiras", " Energia"]
+
+
+def client_names(n: int, rng: np.random.Generator) -> list[str]:
+    names: set[str] = set()
+    while len(names) < n:
+        parts = rng.choice(_SYLLABLES, size=rng.integers(2, 4))
+        names.add("".join(parts).capitalize() + _SUFFIXES[rng.integers(len(_SUFFIXES))])
+    return sorted(names)
+
+
+def _variant(names: pd.Series, rng: np.random.Generator) -> pd.Series:
+    # Grafias alternativas do mesmo cliente (o cadastro deve juntar todas)
+    kind = rng.integers(0, 3, len(names))
+    out = names.copy()
+    out[kind == 0] = names[kind == 0].str.upper()
+    out[kind == 1] = names[kind == 1].str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    out[kind == 2] = "  " + names[kind == 2].str.replace(" ", "  ") + " "
+    return out
+
+
+def generate(rows: int, start: str = "2024-01-01", months: int = 18, clients: int = 200,
+             seed: int = 0, variant_share: float = 0.02) -> pd.DataFrame:
+    """Livro sintético com `rows` linhas nas colunas COLS, ordenado por Data."""
+    rng = np.random.default_rng(seed)
+    names = np.array(client_names(clients, rng), dtype=object)
+    weights = 1.0 / np.arange(1, clients + 1) ** 1.1
+    weights /= weights.sum()
+    main_tipo = rng.choice(len(TIPOS), size=clients, p=TIPO_WEIGHTS)
+    scale = rng.lognormal(0.0, 0.25, size=clients)
+
+    client = rng.choice(clients, size=rows, p=weights)
+    # 85% dos tickets no produto principal do cliente
+    tipo_idx = np.where(rng.random(rows) < 0.85, main_tipo[client], rng.choice(len(TIPOS), size=rows, p=TIPO_WEIGHTS))
+    tipos = np.array(TIPOS, dtype=object)[tipo_idx]
+    unidades = np.empty(rows, dtype=object)
+    for t, units in UNITS_BY_TIPO.items():
+        mask = tipos == t
+        unidades[mask] = np.array(units, dtype=object)[rng.integers(0, len(units), mask.sum())]
+    base = pd.Series(unidades).map(UNIT_SCALE).to_numpy()
+    qtd = np.round(base * scale[client] * rng.lognormal(0.0, 0.3, size=rows), 2)
+
+    days = pd.date_range(start, pd.Timestamp(start) + pd.DateOffset(months=months) - pd.Timedelta(days=1), freq="D")
+    day_w = WEEKDAY_WEIGHTS[days.dayofweek]
+    data = days.to_numpy()[rng.choice(len(days), size=rows, p=day_w / day_w.sum())]
+
+    cliente = pd.Series(names[client])
+    variant = rng.random(rows) < variant_share
+    cliente[variant] = _variant(cliente[variant], rng)
+    status = np.where(rng.random(rows) < 0.03, "verificando", "ok")
+
+    df = pd.DataFrame({"Data": data, "Tipo": tipos, "Cliente": cliente.to_numpy(), "Unidade": unidades,
+                       "Quantidade": qtd, "Status": status})[COLS]
+    return df.sort_values("Data", kind="stable", ignore_index=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--inicio", default="2024-01-01", help="primeiro dia (AAAA-MM-DD)")
+    parser.add_argument("--meses", type=int, default=18)
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--dados", help="grava num armazenamento Parquet (pasta)")
+    parser.add_argument("--csv", help="grava um CSV no formato do importador")
+    args = parser.parse_args(argv)
+    if not args.dados and not args.csv:
+        parser.error("informe --dados e/ou --csv")
+
+    df = generate(args.linhas, args.inicio, args.meses, args.clientes, args.semente)
+    if args.csv:
+        df.assign(Data=df["Data"].dt.strftime("%Y-%m-%d")).to_csv(args.csv, index=False)
+    if args.dados:
+        repo = LedgerRepository(args.dados)
+        for i in range(0, len(df), SYNTH_CHUNK_ROWS):
+            repo.append(df.iloc[i:i + SYNTH_CHUNK_ROWS])
+            print(f"\r{min(i + SYNTH_CHUNK_ROWS, len(df))}/{len(df)} linha(s)", end="", file=sys.stderr)
+        print(file=sys.stderr)
+    print(f"{len(df)} linha(s) geradas ({df['Data'].min():%d/%m/%Y} a {df['Data'].max():%d/%m/%Y}, "
+          f"{df['Cliente'].nunique()} grafias de cliente)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------- Modelo tipado -----------------------------
+COLS = ["Data","Tipo","Cliente","Unidade","Quantidade","Status"]
+# Identificador estável da linha, atribuído pelo repositório na gravação
+ID_COL = "ID"
+# Motivo(s) das regras automáticas para Status "verificando" ("revisado" = liberado por um operador)
+ALERT_COL = "Alerta"
+TIPOS = ["Toras", "Cavaco", "Lenha"]
+UNIDADES = ["ST", "TN", "m3"]
+STATUS = ["ok", "verificando"]
+KNOWN_CATEGORIES = {"Tipo": TIPOS, "Unidade": UNIDADES, "Status": STATUS}
+UNITS_BY_TIPO = {"Toras": ["ST"], "Cavaco": ["TN", "m3"], "Lenha": ["ST", "m3", "TN"]}
+
+
+def as_category(s: pd.Series, known: list[str] | None = None) -> pd.Series:
+    # Mantém a ordem das categorias conhecidas e acrescenta valores novos ao final,
+    # para não perder nada que ainda não passou pela validação
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.fillna("").astype(str).astype("category")
+    s = s.cat.remove_unused_categories()
+    extra = sorted(str(c) for c in s.cat.categories if c not in set(known or []))
+    cats = list(known or []) + extra
+    if list(s.cat.categories) != cats:
+        s = s.cat.set_categories(cats)
+    return s
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    # A coluna ID é mantida quando existe (nula para linhas ainda não gravadas); Alerta sempre sai, vazio se faltar
+    out = df[[ID_COL] + COLS if ID_COL in df.columns else COLS].copy()
+    out[ALERT_COL] = df[ALERT_COL] if ALERT_COL in df.columns else ""
+    if ID_COL in out.columns:
+        out[ID_COL] = pd.to_numeric(out[ID_COL], errors="coerce").astype("Int64")
+    out["Data"] = pd.to_datetime(out["Data"]).dt.normalize()
+    out["Quantidade"] = pd.to_numeric(out["Quantidade"], errors="coerce").fillna(0.0).astype("float64")
+    for c, known in KNOWN_CATEGORIES.items():
+        out[c] = as_category(out[c], known)
+    out["Cliente"] = as_category(out["Cliente"])
+    out[ALERT_COL] = as_category(out[ALERT_COL])
+    return out
+
+
+class LedgerTable:
+    """Tabela de lançamentos ordenada por Data.
+
+    O filtro de período usa busca binária (`searchsorted`) sobre a coluna Data
+    ordenada e vira um fatiamento posicional (`iloc`), sem reconverter datas nem
+    copiar a tabela.
+    """
+
+    def __init__(self, df: pd.DataFrame, normalized: bool = False):
+        frame = df if normalized else normalize(df)
+        frame = frame.sort_values("Data", kind="stable").reset_index(drop=True)
+        self.frame = frame
+        self._dates = frame["Data"].to_numpy()
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def between(self, start, end) -> pd.DataFrame:
+        # [start, end] inclusivo, em dias
+        i = self._dates.searchsorted(np.datetime64(pd.Timestamp(start).normalize()), side="left")
+        j = self._dates.searchsorted(np.datetime64(pd.Timestamp(end).normalize()), side="right")
+        return self.frame.iloc[i:j]
+
+    def filter_range(self, start, end, tipo: str | None = None, cliente: str | None = None) -> pd.DataFrame:
+        return self._match(self.between(start, end), tipo, cliente)
+
+    @staticmethod
+    def _match(part: pd.DataFrame, tipo: str | None, cliente: str | None) -> pd.DataFrame:
+        mask = None
+        for col, value in (("Tipo", tipo), ("Cliente", cliente)):
+            if value is None:
+                continue
+            cats = part[col].cat.categories
+            if value not in cats:
+                return part.iloc[0:0]
+            hit = part[col].cat.codes.to_numpy() == cats.get_loc(value)
+            mask = hit if mask is None else mask & hit
+        return part if mask is None else part[mask]
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from table import TIPOS, UNIDADES
+
+CONVERSION_COLS = ["Tipo", "Unidade", "Cliente", "Fator"]
+# Fator = m³ de referência por 1 unidade. Só a razão entre unidades do mesmo Tipo importa.
+# Valores de partida (empilhamento/densidade médios); cada operação ajusta no cadastro,
+# inclusive por cliente (Cliente vazio = vale para todos).
+DEFAULT_FACTORS = [
+    ("Toras", "m3", 1.0), ("Toras", "ST", 0.70), ("Toras", "TN", 1.10),
+    ("Cavaco", "m3", 1.0), ("Cavaco", "ST", 1.0), ("Cavaco", "TN", 2.80),
+    ("Lenha", "m3", 1.0), ("Lenha", "ST", 0.65), ("Lenha", "TN", 1.40),
+]
+
+
+def _factor_of(keys: pd.DataFrame, factors: pd.DataFrame) -> np.ndarray:
+    # Uma junção vetorizada: fator do cliente quando houver, senão o geral do (Tipo, Unidade)
+    specific = keys.merge(factors, on=["Tipo", "Unidade", "Cliente"], how="left")["Fator"]
+    general = keys.merge(factors[factors["Cliente"] == ""].drop(columns="Cliente"),
+                         on=["Tipo", "Unidade"], how="left")["Fator"]
+    return specific.fillna(general).to_numpy(dtype="float64")
+
+
+def convert(daily: pd.DataFrame, factors: pd.DataFrame, unit: str | None) -> tuple[pd.DataFrame, int]:
+    """Converte a Quantidade do cubo diário para `unit` (None = unidades originais).
+
+    Devolve o cubo convertido e o número de tickets que ficaram de fora por falta
+    de fator. O custo é o mesmo com uma ou várias unidades no período.
+    """
+    if unit is None or daily.empty:
+        return daily, 0
+    keys = pd.DataFrame({
+        "Tipo": daily["Tipo"].astype(str).to_numpy(),
+        "Unidade": daily["Unidade"].astype(str).to_numpy(),
+        "Cliente": daily["Cliente"].astype(str).to_numpy(),
+    })
+    ratio = _factor_of(keys, factors) / _factor_of(keys.assign(Unidade=unit), factors)
+    ok = np.isfinite(ratio)
+    out = daily[ok].assign(Quantidade=daily["Quantidade"].to_numpy()[ok] * ratio[ok])
+    return out, int(daily["Tickets"].to_numpy()[~ok].sum())
+
+
+class ConversionTable:
+    """Tabela de fatores de conversão (Tipo, Unidade, Cliente opcional), persistida em JSON.
+
+    `version` muda a cada gravação e entra na chave dos caches de consulta.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.version = 0
+        if self.path.exists():
+            self._frame = self._clean(pd.DataFrame(json.loads(self.path.read_text("utf-8"))))
+        else:
+            self._frame = self._clean(pd.DataFrame(
+                [(t, u, "", f) for t, u, f in DEFAULT_FACTORS], columns=CONVERSION_COLS))
+
+    def frame(self) -> pd.DataFrame:
+        return self._frame
+
+    def replace(self, df: pd.DataFrame) -> None:
+        clean = self._clean(df)
+        with self._lock:
+            self._frame = clean
+            self.version += 1
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(clean.to_dict("records"), ensure_ascii=False, indent=1), "utf-8")
+            os.replace(tmp, self.path)
+
+    @staticmethod
+    def _clean(df: pd.DataFrame) -> pd.DataFrame:
+        # Descarta linhas incompletas ou com fator não positivo; chave repetida: vale a última
+        df = df.reindex(columns=CONVERSION_COLS)
+        df = df.assign(
+            Tipo=df["Tipo"].fillna("").astype(str).str.strip(),
+            Unidade=df["Unidade"].fillna("").astype(str).str.strip(),
+            Cliente=df["Cliente"].fillna("").astype(str).str.strip(),
+            Fator=pd.to_numeric(df["Fator"], errors="coerce"),
+        )
+        df = df[df["Tipo"].isin(TIPOS) & df["Unidade"].isin(UNIDADES) & (df["Fator"] > 0)]
+        df = df.drop_duplicates(["Tipo", "Unidade", "Cliente"], keep="last")
+        return df.sort_values(["Tipo", "Cliente", "Unidade"], ignore_index=True)